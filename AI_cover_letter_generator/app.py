@@ -1,32 +1,50 @@
 import os
 import json
-from flask import Flask, render_template, request, jsonify
-import google.generativeai as genai
+from flask import Flask, Response, render_template, request, jsonify, url_for
 from dotenv import load_dotenv
-import io 
-import pdfplumber
-import docx 
+
+from content_cache import TwoTierCache
+from extraction import MAX_UPLOAD_BYTES, ExtractionError, extract_upload
+from jobs import Busy, JobManager
+from structuring import (
+    PromptMetrics, as_prompt_fields, count_tokens, fit_to_budget, is_usable, structure_job, structure_resume,
+)
+from llm_backend import LLMError, create_backend
 
 load_dotenv()
 
 app = Flask(__name__)
-
-# Configure the Generative AI API
-try:
-    gemini_api_key = os.environ.get("GEMINI_API_KEY")
-    if not gemini_api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables.")
-    genai.configure(api_key=gemini_api_key)
-    model = genai.GenerativeModel('gemini-1.5-flash-latest') # Or 'gemini-pro'
-except Exception as e:
-    print(f"Error configuring GenAI: {e}")
-    model = None
-
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'json', 'docx'}
-
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Two files per request plus form overhead; Flask rejects bigger bodies with 413
+app.config['MAX_CONTENT_LENGTH'] = 2 * MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Configure the Generative AI API (LLM_BACKEND=fake uses a local stand-in for testing)
+backend = create_backend()
+
+# Content-hash keyed caches: extracted file contents, and letters per exact prompt
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+CACHE_MEMORY_ENTRIES = int(os.environ.get("CACHE_MEMORY_ENTRIES", 256))
+CACHE_DISK_MB = int(os.environ.get("CACHE_DISK_MB", 200))
+extraction_cache = TwoTierCache("extraction", CACHE_DIR, max_entries=CACHE_MEMORY_ENTRIES,
+                                max_disk_bytes=CACHE_DISK_MB * 1024 * 1024)
+letter_cache = TwoTierCache("letters", CACHE_DIR, max_entries=CACHE_MEMORY_ENTRIES,
+                            max_disk_bytes=CACHE_DISK_MB * 1024 * 1024,
+                            ttl=float(os.environ.get("LETTER_CACHE_TTL", 7 * 24 * 3600)))
+
+# Raw text uploads are pre-extracted locally into the structured prompt, trimmed to this budget
+PRE_EXTRACT = os.environ.get("PRE_EXTRACT", "1") == "1"
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", 1500))
+prompt_metrics = PromptMetrics()
+
+# Generations run on a bounded pool so slow Gemini calls never hold request threads
+job_manager = None
+if backend is not None:
+    job_manager = JobManager(
+        backend,
+        max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 4)),
+        timeout=float(os.environ.get("LLM_TIMEOUT", 60)),
+        queue_timeout=float(os.environ.get("LLM_QUEUE_TIMEOUT", 30)),
+        letter_cache=letter_cache,
+    )
 
 def extract_data_from_file(uploaded_file):
     """
@@ -37,53 +55,16 @@ def extract_data_from_file(uploaded_file):
         return None, "No file provided or file has no name."
 
     filename = uploaded_file.filename
-    if not allowed_file(filename):
-        return None, f"File type not allowed. Please use {', '.join(ALLOWED_EXTENSIONS)}."
-
-    file_ext = filename.rsplit('.', 1)[1].lower()
-    
     try:
-        # Use uploaded_file.stream for libraries that expect a file-like object
-        # For libraries that might close the stream, or for multiple reads, copy to BytesIO
-        file_stream = io.BytesIO(uploaded_file.read()) # Read once into memory
-        uploaded_file.close() # Ensure original stream is closed if not managed by Flask
-
-        if file_ext == 'json':
-            try:
-                # Reset stream position if it was read into BytesIO
-                file_stream.seek(0)
-                data = json.load(file_stream)
-                return data, None
-            except json.JSONDecodeError:
-                return None, "Invalid JSON content."
-        
-        elif file_ext == 'txt':
-            file_stream.seek(0)
-            return file_stream.read().decode('utf-8', errors='ignore'), None
-        
-        elif file_ext == 'pdf':
-            text_content = ""
-            # pdfplumber works directly with file paths or file-like objects
-            # To avoid saving the file, we pass the BytesIO stream
-            file_stream.seek(0)
-            with pdfplumber.open(file_stream) as pdf:
-                for page in pdf.pages:
-                    text_content += page.extract_text() + "\n"
-            return text_content, None
-            
-        elif file_ext == 'docx':
-            text_content = ""
-            file_stream.seek(0)
-            document = docx.Document(file_stream)
-            for para in document.paragraphs:
-                text_content += para.text + "\n"
-            return text_content, None
-            
+        # The upload is streamed into a spooled temp file, never read whole into memory
+        return extract_upload(uploaded_file.stream, filename, cache=extraction_cache), None
+    except ExtractionError as e:
+        return None, str(e)
     except Exception as e:
         print(f"Error processing file {filename}: {e}")
         return None, f"Could not process file {filename}. Error: {str(e)}"
-    
-    return None, "Unsupported file type or error during processing."
+    finally:
+        uploaded_file.close() # Ensure original stream is closed if not managed by Flask
 
 
 def generate_cover_letter_prompt_structured(resume_data, job_desc_data):
@@ -170,27 +151,30 @@ def generate_cover_letter_prompt_unstructured(resume_text, job_desc_text):
 def index():
     return render_template('index.html') # No more default data
 
-@app.route('/generate', methods=['POST'])
-def generate():
-    if not model:
-        return jsonify({"error": "Generative AI model not configured. Please check API key."}), 500
+def build_prompt_from_request():
+    """
+    Validates the uploaded files and builds the prompt.
+    Returns (prompt, None) or (None, (error_response, status)).
+    """
+    if job_manager is None:
+        return None, (jsonify({"error": "Generative AI model not configured. Please check API key."}), 500)
 
     if 'resume' not in request.files or 'job_description' not in request.files:
-        return jsonify({"error": "Both resume and job description files are required."}), 400
+        return None, (jsonify({"error": "Both resume and job description files are required."}), 400)
 
     resume_file = request.files['resume']
     job_file = request.files['job_description']
 
     if resume_file.filename == '' or job_file.filename == '':
-        return jsonify({"error": "No selected file or empty filename."}), 400
+        return None, (jsonify({"error": "No selected file or empty filename."}), 400)
 
     resume_data, error_resume = extract_data_from_file(resume_file)
     if error_resume:
-        return jsonify({"error": f"Resume processing error: {error_resume}"}), 400
+        return None, (jsonify({"error": f"Resume processing error: {error_resume}"}), 400)
 
     job_data, error_job = extract_data_from_file(job_file)
     if error_job:
-        return jsonify({"error": f"Job description processing error: {error_job}"}), 400
+        return None, (jsonify({"error": f"Job description processing error: {error_job}"}), 400)
 
     prompt = ""
     is_structured_input = isinstance(resume_data, dict) and isinstance(job_data, dict)
@@ -198,6 +182,8 @@ def generate():
     if is_structured_input:
         prompt = generate_cover_letter_prompt_structured(resume_data, job_data)
         print("\n--- USING STRUCTURED PROMPT ---")
+    elif PRE_EXTRACT and not isinstance(resume_data, dict) and not isinstance(job_data, dict):
+        prompt = pre_extracted_prompt(resume_data, job_data)
     else:
         # If one is dict, convert to string for unstructured prompt
         resume_text_for_prompt = json.dumps(resume_data, indent=2) if isinstance(resume_data, dict) else str(resume_data)
@@ -208,29 +194,109 @@ def generate():
     print("\n--- PROMPT SENT TO GENAI (First 500 chars) ---")
     print(prompt[:500] + "...")
     print("----------------------------------------------\n")
+    return prompt, None
 
-    try:
-        response = model.generate_content(prompt)
-        generated_text = ""
-        if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
-            generated_text = response.candidates[0].content.parts[0].text
-        else:
-            # Try to get text from prompt_feedback if generation failed due to safety or other reasons
-            if response.prompt_feedback and response.prompt_feedback.block_reason:
-                 generated_text = f"Error: Generation blocked. Reason: {response.prompt_feedback.block_reason_message or response.prompt_feedback.block_reason}"
-            else:
-                generated_text = "Error: Could not retrieve text from GenAI response. The response might be empty or malformed."
-            print(f"Unexpected GenAI response structure or issue: {response}")
-        
+def pre_extracted_prompt(resume_text, job_text):
+    """
+    Builds the structured prompt from raw texts via local section extraction,
+    falling back to the unstructured prompt when too little is recognized.
+    """
+    raw_prompt = generate_cover_letter_prompt_unstructured(resume_text, job_text)
+    resume, job = structure_resume(resume_text), structure_job(job_text)
+    if not is_usable(resume, job):
+        print("\n--- PRE-EXTRACTION FOUND TOO LITTLE, USING UNSTRUCTURED PROMPT ---")
+        return raw_prompt
+
+    def build(resume, job):
+        return generate_cover_letter_prompt_structured(as_prompt_fields(resume), job)
+
+    resume, job, dropped = fit_to_budget(resume, job, build, PROMPT_TOKEN_BUDGET)
+    prompt = build(resume, job)
+    raw_tokens, prompt_tokens = count_tokens(raw_prompt), count_tokens(prompt)
+    prompt_metrics.record(raw_tokens, prompt_tokens)
+    print(f"\n--- USING PRE-EXTRACTED STRUCTURED PROMPT: ~{prompt_tokens} tokens instead of "
+          f"~{raw_tokens} ({dropped} low-relevance items dropped) ---")
+    return prompt
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        "prompt_tokens": prompt_metrics.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "letter_cache": letter_cache.stats(),
+    })
+
+def job_response(job):
+    """Maps a job's state to a JSON response and status code."""
+    if job is None:
+        return jsonify({"error": "Unknown or expired job."}), 404
+    body = {"job_id": job["job_id"], "status": job["status"], "cached": job["cached"]}
+    if job["status"] in ("queued", "running"):
+        return jsonify(body), 202
+    if job["status"] == "done":
         print("\n--- RESPONSE FROM GENAI (First 500 chars) ---")
-        print(generated_text[:500] + "...")
+        print(job["cover_letter"][:500] + "...")
         print("---------------------------------------------\n")
+        return jsonify(dict(body, cover_letter=job["cover_letter"])), 200
+    return jsonify(dict(body, error=job["error"])), 504 if job["status"] == "timeout" else 500
 
-        return jsonify({"cover_letter": generated_text})
-
-    except Exception as e:
-        print(f"Error during GenAI call: {e}")
-        return jsonify({"error": f"An error occurred with the AI model: {str(e)}"}), 500
+@app.route('/generate', methods=['POST'])
+def generate():
+    """Synchronous generation: waits for the job and returns the letter."""
+    prompt, error = build_prompt_from_request()
+    if error:
+        return error
+    try:
+        job_id = job_manager.submit(prompt)
+    except Busy as e:
+        return jsonify({"error": str(e)}), 503
+    return job_response(job_manager.wait(job_id))
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queues a generation and returns immediately with a job id to poll."""
+    prompt, error = build_prompt_from_request()
+    if error:
+        return error
+    try:
+        job_id = job_manager.submit(prompt)
+    except Busy as e:
+        return jsonify({"error": str(e)}), 503
+    # Cached letters are already done; the client finds them on its first poll
+    return jsonify({"job_id": job_id, "status": job_manager.get(job_id)["status"],
+                    "status_url": url_for('job_status', job_id=job_id)}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    return job_response(job_manager.get(job_id) if job_manager else None)
+
+@app.route('/generate/stream', methods=['POST'])
+def generate_stream():
+    """Forwards Gemini's chunks to the browser as they arrive (text/plain)."""
+    prompt, error = build_prompt_from_request()
+    if error:
+        return error
+    try:
+        chunks = job_manager.stream(prompt)
+    except Busy as e:
+        return jsonify({"error": str(e)}), 503
+
+    def body():
+        try:
+            for chunk in chunks:
+                yield chunk
+        except LLMError as e:
+            # Headers are already sent, so errors are reported in-band
+            yield f"\n\n[Error: {e}]"
+        except Exception as e:
+            print(f"Error during GenAI call: {e}")
+            yield f"\n\n[Error: An error occurred with the AI model: {e}]"
+        finally:
+            chunks.close()
+
+    # X-Accel-Buffering stops nginx from holding chunks back
+    return Response(body(), mimetype='text/plain', headers={"X-Accel-Buffering": "no", "Cache-Control": "no-cache"})
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Development server only; see README for running under gunicorn
+    app.run(debug=os.environ.get("FLASK_DEBUG", "1") == "1", threaded=True)
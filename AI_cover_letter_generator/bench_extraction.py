@@ -0,0 +1,124 @@
+"""
+Extraction benchmark over large multi-page resumes: wall time and peak
+Python memory of the old in-memory extraction versus the spooled, capped
+and (for PDFs) parallel extraction in extraction.py.
+
+    python bench_extraction.py --pages 10 50 --lines-per-page 60 [--trace-memory]
+
+The PDFs are generated here with a minimal writer (Helvetica text pages), so
+no PDF library beyond pdfplumber is needed.
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import docx
+import pdfplumber
+
+import extraction
+
+WORDS = ("python data pipeline engineer experience project team led designed built "
+         "scalable services analytics cloud kubernetes spark sql reporting").split()
+
+
+def make_pdf(n_pages, lines_per_page=60):
+    """Returns the bytes of an n_pages PDF with lines_per_page lines of text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for p in range(n_pages):
+        lines = []
+        for i in range(lines_per_page):
+            words = " ".join(WORDS[(p + i + j) % len(WORDS)] for j in range(12))
+            lines.append(f"({words}) Tj 0 -12 Td")
+        stream = "BT /F1 10 Tf 40 800 Td " + " ".join(lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {n_pages} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_docx(n_paragraphs):
+    document = docx.Document()
+    for i in range(n_paragraphs):
+        document.add_paragraph(" ".join(WORDS[(i + j) % len(WORDS)] for j in range(20)))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def legacy_extract(data, file_ext):
+    # The previous implementation: whole upload in a BytesIO, text joined with +=
+    file_stream = io.BytesIO(data)
+    text_content = ""
+    if file_ext == "pdf":
+        with pdfplumber.open(file_stream) as pdf:
+            for page in pdf.pages:
+                text_content += (page.extract_text() or "") + "\n"
+    else:
+        for para in docx.Document(file_stream).paragraphs:
+            text_content += para.text + "\n"
+    return text_content
+
+
+def measure(fn, trace_memory=False):
+    # tracemalloc slows pdfminer down several times, so peak memory is opt-in
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    text = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else float("nan")
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), len(text)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark resume text extraction.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--lines-per-page", type=int, default=60)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also report peak Python memory of the main process (slow)")
+    args = parser.parse_args()
+
+    # Start the worker processes outside the timed runs
+    extraction.get_pool().submit(len, "").result()
+
+    print(f"{'input':<14} {'method':<16} {'seconds':>8} {'peak MB':>8} {'chars':>9}")
+    for n_pages in args.pages:
+        cases = [("pdf", f"pdf {n_pages}p", make_pdf(n_pages, args.lines_per_page)),
+                 ("docx", f"docx {n_pages * 20}par", make_docx(n_pages * 20))]
+        for file_ext, label, data in cases:
+            methods = {"legacy": lambda: legacy_extract(data, file_ext)}
+            if file_ext == "pdf":
+                def serial(data=data):
+                    workers = extraction.EXTRACT_WORKERS
+                    extraction.EXTRACT_WORKERS = 1
+                    try:
+                        return extraction.extract_upload(io.BytesIO(data), "resume.pdf")
+                    finally:
+                        extraction.EXTRACT_WORKERS = workers
+                methods["spooled serial"] = serial
+                methods["spooled parallel"] = lambda data=data: extraction.extract_upload(io.BytesIO(data), "resume.pdf")
+            else:
+                methods["spooled"] = lambda data=data: extraction.extract_upload(io.BytesIO(data), "resume.docx")
+            for name, fn in methods.items():
+                seconds, peak_mb, chars = measure(fn, args.trace_memory)
+                print(f"{label:<14} {name:<16} {seconds:>8.2f} {peak_mb:>8.1f} {chars:>9}")
+    print(f"(spooled methods stop at {extraction.MAX_PAGES} pages / {extraction.MAX_TEXT_CHARS} chars)")
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(*parts):
+    """sha256 over the given str/bytes parts, separated so ("ab", "c") != ("a", "bc")."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode("utf-8") if isinstance(part, str) else part
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class TwoTierCache:
+    """
+    Content-addressed cache with an in-memory LRU tier in front of a disk tier.
+
+    Values must be JSON-serializable. Lookups hit memory first, then the disk,
+    promoting disk hits back into memory. Each tier evicts least recently used
+    entries: memory by entry count, disk by total bytes (a disk read refreshes
+    the file's mtime, which is what the disk tier orders by). Entries older
+    than ttl seconds are treated as misses.
+    """
+
+    def __init__(self, name, cache_dir=".cache", max_entries=256, max_disk_bytes=200 * 1024 * 1024, ttl=None):
+        self.name = name
+        self.disk_dir = os.path.join(cache_dir, name) if cache_dir else None
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    def _path(self, key):
+        # Two-character fan-out keeps directories small
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _expired(self, created):
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key):
+        """Returns the cached value or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+        entry = self._read_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits["disk"] += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    def set(self, key, value):
+        entry = (time.time(), value)
+        with self._lock:
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(record["created"]):
+            self._remove(path)
+            return None
+        try:
+            # Mark as recently used for disk eviction
+            os.utime(path)
+        except OSError:
+            # Evicted by another thread since it was read; the value is still good
+            pass
+        return record["created"], record["value"]
+
+    def _write_disk(self, key, entry):
+        if self.disk_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps({"created": entry[0], "value": entry[1]}, ensure_ascii=False).encode("utf-8")
+        # Written to a temp file and renamed so readers never see a partial entry
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        try:
+            # An overwrite replaces the old entry's bytes instead of adding to them
+            replaced_bytes = os.path.getsize(path)
+        except OSError:
+            replaced_bytes = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(data) - replaced_bytes
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._evict_disk()
+
+    def _disk_entries(self):
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        # Evict down to 90% so a full cache does not rescan on every write
+        target = 0.9 * self.max_disk_bytes
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            self._remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "hit_rate": (self.hits["memory"] + self.hits["disk"]) / lookups if lookups else 0.0,
+            }
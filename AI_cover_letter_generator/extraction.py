@@ -0,0 +1,194 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pdfplumber
+import docx
+
+from content_cache import content_key
+
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'json', 'docx'}
+
+# Per-request limits; together they bound the memory one extraction can use
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+MAX_PAGES = int(os.environ.get("MAX_PDF_PAGES", 50))
+MAX_TEXT_CHARS = int(os.environ.get("MAX_TEXT_CHARS", 200_000))
+# Uploads up to this size stay in memory, larger ones are spooled to disk
+SPOOL_THRESHOLD = 1024 * 1024
+# PDFs with at least this many pages are split across worker processes
+PARALLEL_MIN_PAGES = int(os.environ.get("PARALLEL_MIN_PAGES", 8))
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+
+_pool = None
+
+
+class ExtractionError(Exception):
+    """The upload could not be turned into text; the message is shown to the user."""
+
+
+def allowed_file(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def get_pool():
+    # Created on first use so importing the module never starts processes.
+    # Workers are not forked from the app: a fork copies its threads' locks
+    # (request threads, the LLM job pool) in whatever state they are in
+    global _pool
+    if _pool is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def spool_upload(stream, max_bytes=MAX_UPLOAD_BYTES, chunk_size=64 * 1024, digest=None):
+    """
+    Copies an upload stream into a SpooledTemporaryFile in fixed-size chunks,
+    so the upload is never held in memory twice and large files go to disk.
+    If digest (a hashlib object) is given it is updated with every chunk.
+    Raises ExtractionError once more than max_bytes have been read.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_THRESHOLD)
+    total = 0
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        total += len(chunk)
+        if total > max_bytes:
+            spooled.close()
+            raise ExtractionError(f"File is larger than the {max_bytes / (1024 * 1024):.1f} MB limit.")
+        spooled.write(chunk)
+        if digest is not None:
+            digest.update(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+class TextBuffer:
+    """Collects text parts up to max_chars and joins them once at the end."""
+
+    def __init__(self, max_chars=MAX_TEXT_CHARS):
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self.truncated = False
+
+    def add(self, text):
+        """Appends text (None is ignored); returns False once the limit is reached."""
+        if not text or self.truncated:
+            return not self.truncated
+        remaining = self.max_chars - self.size
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.truncated = True
+        self.parts.append(text)
+        self.size += len(text)
+        return not self.truncated
+
+    def text(self):
+        return "\n".join(self.parts)
+
+
+def extract_pdf_pages(path, start, stop):
+    """Runs in a worker process: returns the text of pages [start, stop) of a PDF file."""
+    with pdfplumber.open(path) as pdf:
+        # extract_text() returns None for pages without a text layer
+        return [pdf.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def extract_pdf(spooled, max_pages=MAX_PAGES, max_chars=MAX_TEXT_CHARS):
+    buffer = TextBuffer(max_chars)
+    with pdfplumber.open(spooled) as pdf:
+        n_pages = min(len(pdf.pages), max_pages)
+        if n_pages < PARALLEL_MIN_PAGES or EXTRACT_WORKERS < 2:
+            for page in pdf.pages[:n_pages]:
+                if not buffer.add(page.extract_text()):
+                    break
+                # Drop the parsed layout objects of pages already extracted
+                page.close()
+            return buffer.text()
+
+    # Worker processes need a path to open, so the upload goes to a named file
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as named:
+        spooled.seek(0)
+        shutil.copyfileobj(spooled, named)
+        named.flush()
+        step = -(-n_pages // EXTRACT_WORKERS)
+        futures = [get_pool().submit(extract_pdf_pages, named.name, start, min(start + step, n_pages))
+                   for start in range(0, n_pages, step)]
+        # Results are consumed in page order; later ranges are cancelled once the cap is hit
+        for i, future in enumerate(futures):
+            if not all(buffer.add(text) for text in future.result()):
+                for pending in futures[i + 1:]:
+                    pending.cancel()
+                break
+    return buffer.text()
+
+
+def extract_docx(spooled, max_chars=MAX_TEXT_CHARS):
+    # DOCX has no pages to split on: the whole document is one XML part
+    buffer = TextBuffer(max_chars)
+    document = docx.Document(spooled)
+    for para in document.paragraphs:
+        if not buffer.add(para.text):
+            break
+    return buffer.text()
+
+
+def extract_txt(spooled, max_chars=MAX_TEXT_CHARS, chunk_size=64 * 1024):
+    buffer = TextBuffer(max_chars)
+    parts = []
+    # A UTF-8 character never needs more than 4 bytes, so max_chars * 4 bytes is enough
+    remaining = max_chars * 4
+    for chunk in iter(lambda: spooled.read(min(chunk_size, remaining)), b""):
+        parts.append(chunk)
+        remaining -= len(chunk)
+        if remaining <= 0:
+            break
+    buffer.add(b"".join(parts).decode('utf-8', errors='ignore'))
+    return buffer.text()
+
+
+def _extract(spooled, file_ext):
+    if file_ext == 'json':
+        try:
+            return json.load(spooled)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise ExtractionError("Invalid JSON content.")
+    if file_ext == 'txt':
+        return extract_txt(spooled)
+    if file_ext == 'pdf':
+        return extract_pdf(spooled)
+    if file_ext == 'docx':
+        return extract_docx(spooled)
+    raise ExtractionError("Unsupported file type or error during processing.")
+
+
+def extract_upload(stream, filename, cache=None):
+    """
+    Extracts content from an uploaded file stream.
+    Returns a dictionary if JSON, otherwise a string of text.
+    Raises ExtractionError with a user-facing message.
+
+    With a cache (content_cache.TwoTierCache), results are keyed on the
+    sha256 of the file content, computed while spooling, so re-uploading the
+    same resume skips parsing.
+    """
+    if not allowed_file(filename):
+        raise ExtractionError(f"File type not allowed. Please use {', '.join(ALLOWED_EXTENSIONS)}.")
+    file_ext = filename.rsplit('.', 1)[1].lower()
+
+    digest = hashlib.sha256()
+    with spool_upload(stream, digest=digest) as spooled:
+        if cache is None:
+            return _extract(spooled, file_ext)
+        # The limits change what is extracted, so they are part of the key
+        key = content_key(digest.hexdigest(), file_ext, str(MAX_PAGES), str(MAX_TEXT_CHARS))
+        data = cache.get(key)
+        if data is None:
+            data = _extract(spooled, file_ext)
+            cache.set(key, data)
+        return data
@@ -0,0 +1,167 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from content_cache import content_key
+from llm_backend import LLMError, LLMTimeout
+
+
+class Busy(Exception):
+    """No LLM slot became free in time; the client should retry later."""
+
+
+class JobManager:
+    """
+    Runs cover letter generations off the request thread.
+
+    At most max_concurrency model calls run at once, shared between queued jobs
+    and streaming requests, so a burst of submissions cannot open unbounded
+    connections to the LLM. Jobs wait at most queue_timeout for a slot and
+    each call is cut off after timeout seconds. Finished jobs are kept for
+    result_ttl seconds so clients can poll for them.
+
+    With a letter_cache (content_cache.TwoTierCache), letters are keyed on the
+    backend and the exact prompt, so an identical resume/job pair is answered
+    without calling the model.
+    """
+
+    def __init__(self, backend, max_concurrency=4, timeout=60.0, queue_timeout=30.0,
+                 max_pending=100, result_ttl=600.0, letter_cache=None):
+        self.backend = backend
+        self.letter_cache = letter_cache
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _cache_key(self, prompt):
+        return content_key(getattr(self.backend, "name", type(self.backend).__name__), prompt)
+
+    def cached_letter(self, prompt):
+        if self.letter_cache is None:
+            return None
+        return self.letter_cache.get(self._cache_key(prompt))
+
+    def _store_letter(self, prompt, text):
+        if self.letter_cache is not None and text:
+            self.letter_cache.set(self._cache_key(prompt), text)
+
+    def submit(self, prompt):
+        """Queues a generation and returns its job id. Raises Busy when too many jobs are pending."""
+        self._expire()
+        cached = self.cached_letter(prompt)
+        if cached is not None:
+            job_id = uuid.uuid4().hex
+            with self._lock:
+                self._jobs[job_id] = {"status": "done", "submitted": time.time(), "finished": time.time(),
+                                      "cover_letter": cached, "error": None, "cached": True}
+            return job_id
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+            if pending >= self.max_pending:
+                raise Busy("Too many cover letters are being generated. Please try again shortly.")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {"status": "queued", "submitted": time.time(), "finished": None,
+                                  "cover_letter": None, "error": None, "cached": False}
+        self._executor.submit(self._run, job_id, prompt)
+        return job_id
+
+    def get(self, job_id):
+        """Returns a copy of the job's state, or None if unknown or expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, job_id=job_id) if job else None
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job finishes (or timeout) and returns its state."""
+        deadline = time.monotonic() + (timeout if timeout is not None else self.queue_timeout + self.timeout)
+        while time.monotonic() < deadline:
+            job = self.get(job_id)
+            if job is None or job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(0.05)
+        return self.get(job_id)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, prompt):
+        try:
+            # Time spent queued in the executor counts against queue_timeout
+            waited = time.time() - self.get(job_id)["submitted"]
+            if waited > self.queue_timeout:
+                raise Busy(f"The job waited more than {self.queue_timeout}s for the AI model.")
+            with self.slot(self.queue_timeout - waited):
+                self._update(job_id, status="running")
+                text = self.backend.generate(prompt, timeout=self.timeout)
+            self._store_letter(prompt, text)
+            self._update(job_id, status="done", cover_letter=text, finished=time.time())
+        except (Busy, LLMTimeout) as e:
+            self._update(job_id, status="timeout", error=str(e), finished=time.time())
+        except LLMError as e:
+            self._update(job_id, status="error", error=str(e), finished=time.time())
+        except Exception as e:
+            print(f"Error during GenAI call: {e}")
+            self._update(job_id, status="error", error=f"An error occurred with the AI model: {e}",
+                         finished=time.time())
+
+    def slot(self, timeout=None):
+        """Context manager holding one LLM slot; raises Busy if none frees up within the timeout."""
+        return _Slot(self._slots, self.queue_timeout if timeout is None else timeout)
+
+    def stream(self, prompt):
+        """
+        Returns an iterator of text chunks from the backend that holds an LLM
+        slot until it is exhausted or closed. The slot is acquired here, so
+        Busy is raised before any response has been sent. A cached letter is
+        returned as a single chunk without taking a slot.
+        """
+        cached = self.cached_letter(prompt)
+        if cached is not None:
+            return (chunk for chunk in [cached])
+        chunks = self._stream(prompt)
+        next(chunks)
+        return chunks
+
+    def _stream(self, prompt):
+        with self.slot():
+            # Primed by stream(); closing the generator after this point releases the slot
+            yield None
+            deadline = time.monotonic() + self.timeout
+            parts = []
+            for chunk in self.backend.stream(prompt, timeout=self.timeout):
+                if time.monotonic() > deadline:
+                    raise LLMTimeout(f"The AI model did not finish within {self.timeout}s.")
+                parts.append(chunk)
+                yield chunk
+            # Only complete letters are cached, never one cut off by an error or disconnect
+            self._store_letter(prompt, "".join(parts))
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job["finished"] and job["finished"] < cutoff]:
+                del self._jobs[job_id]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Slot:
+    def __init__(self, semaphore, timeout):
+        self.semaphore = semaphore
+        self.timeout = timeout
+
+    def __enter__(self):
+        if not self.semaphore.acquire(timeout=self.timeout):
+            raise Busy("The AI model is busy. Please try again shortly.")
+        return self
+
+    def __exit__(self, *exc):
+        self.semaphore.release()
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import re
+import time
+
+
+class LLMError(Exception):
+    """The model call failed or returned no usable text."""
+
+
+class LLMTimeout(LLMError):
+    """The model call did not finish within the request timeout."""
+
+
+def _parts_text(response):
+    if response.candidates and response.candidates[0].content and response.candidates[0].content.parts:
+        return "".join(part.text for part in response.candidates[0].content.parts)
+    return None
+
+
+def _check_blocked(response):
+    # Try to get text from prompt_feedback if generation failed due to safety or other reasons
+    if response.prompt_feedback and response.prompt_feedback.block_reason:
+        raise LLMError(
+            f"Generation blocked. Reason: "
+            f"{response.prompt_feedback.block_reason_message or response.prompt_feedback.block_reason}"
+        )
+
+
+def response_text(response):
+    """
+    Returns the generated text of a Gemini response.
+    Raises LLMError when generation was blocked or the response is malformed.
+    """
+    text = _parts_text(response)
+    if text is not None:
+        return text
+    _check_blocked(response)
+    print(f"Unexpected GenAI response structure or issue: {response}")
+    raise LLMError("Could not retrieve text from GenAI response. The response might be empty or malformed.")
+
+
+class GeminiBackend:
+    """Google Gemini through google-generativeai, with a per-request timeout."""
+
+    def __init__(self, api_key, model_name="gemini-1.5-flash-latest"):
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.name = f"gemini:{model_name}"
+
+    def _call(self, prompt, timeout, stream):
+        from google.api_core import exceptions as google_exceptions
+
+        try:
+            return self.model.generate_content(prompt, stream=stream, request_options={"timeout": timeout})
+        except google_exceptions.DeadlineExceeded as e:
+            raise LLMTimeout(f"The AI model did not respond within {timeout}s.") from e
+
+    def generate(self, prompt, timeout):
+        return response_text(self._call(prompt, timeout, stream=False))
+
+    def stream(self, prompt, timeout):
+        """Yields text chunks as Gemini produces them."""
+        for chunk in self._call(prompt, timeout, stream=True):
+            text = _parts_text(chunk)
+            if text:
+                yield text
+            else:
+                _check_blocked(chunk)
+
+
+class FakeBackend:
+    """
+    Local stand-in for Gemini: returns a deterministic letter after a
+    configurable latency, streamed word by word. Lets the serving path
+    (concurrency limits, timeouts, streaming) be exercised without an API key.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency=1.0, chunk_delay=0.02):
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+
+    def _letter(self, prompt):
+        match = re.search(r"Job Title: (.+)", prompt)
+        title = match.group(1).strip() if match else "the advertised position"
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        return (
+            "Dear Hiring Manager,\n\n"
+            f"I am excited to apply for {title}. This is a locally generated test letter "
+            f"(prompt {digest}, {len(prompt)} characters) produced without calling Gemini.\n\n"
+            "Sincerely,\nThe Applicant"
+        )
+
+    def _wait(self, seconds, deadline, timeout):
+        if time.monotonic() + seconds > deadline:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            raise LLMTimeout(f"The AI model did not respond within {timeout}s.")
+        time.sleep(seconds)
+
+    def generate(self, prompt, timeout):
+        deadline = time.monotonic() + timeout
+        self._wait(self.latency, deadline, timeout)
+        return self._letter(prompt)
+
+    def stream(self, prompt, timeout):
+        deadline = time.monotonic() + timeout
+        self._wait(self.latency, deadline, timeout)
+        for word in re.findall(r"\S+\s*", self._letter(prompt)):
+            self._wait(self.chunk_delay, deadline, timeout)
+            yield word
+
+
+def create_backend():
+    """
+    Builds the backend selected by LLM_BACKEND ("gemini" by default, or "fake").
+    Returns None if the backend could not be configured.
+    """
+    if os.environ.get("LLM_BACKEND", "gemini") == "fake":
+        return FakeBackend(
+            latency=float(os.environ.get("FAKE_LLM_LATENCY", 1.0)),
+            chunk_delay=float(os.environ.get("FAKE_LLM_CHUNK_DELAY", 0.02)),
+        )
+    try:
+        gemini_api_key = os.environ.get("GEMINI_API_KEY")
+        if not gemini_api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables.")
+        return GeminiBackend(gemini_api_key, os.environ.get("GEMINI_MODEL", "gemini-1.5-flash-latest"))
+    except Exception as e:
+        print(f"Error configuring GenAI: {e}")
+        return None
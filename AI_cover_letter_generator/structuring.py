@@ -0,0 +1,241 @@
+import re
+import threading
+
+# Heading text (lowercased, without trailing colon) -> section name
+RESUME_HEADINGS = {
+    "summary": "summary", "profile": "summary", "professional summary": "summary", "objective": "summary",
+    "about me": "summary",
+    "skills": "skills", "technical skills": "skills", "core skills": "skills", "key skills": "skills",
+    "core competencies": "skills", "technologies": "skills", "tools": "skills",
+    "experience": "experience", "work experience": "experience", "professional experience": "experience",
+    "employment": "experience", "employment history": "experience", "work history": "experience",
+    "education": "education", "academic background": "education", "qualifications": "education",
+    "projects": "projects", "personal projects": "projects", "key projects": "projects",
+    "certifications": "certifications", "certificates": "certifications", "awards": "certifications",
+    "contact": "contact", "contact information": "contact",
+}
+JOB_HEADINGS = {
+    "about us": "about_company", "about the company": "about_company", "who we are": "about_company",
+    "company overview": "about_company",
+    "requirements": "requirements", "qualifications": "requirements", "required skills": "requirements",
+    "what you bring": "requirements", "what we're looking for": "requirements",
+    "what we are looking for": "requirements", "minimum qualifications": "requirements",
+    "preferred qualifications": "requirements", "nice to have": "requirements", "skills": "requirements",
+    "must have": "requirements",
+    "responsibilities": "responsibilities", "key responsibilities": "responsibilities",
+    "what you'll do": "responsibilities", "what you will do": "responsibilities", "duties": "responsibilities",
+    "the role": "responsibilities", "role description": "responsibilities",
+}
+
+BULLET_RE = re.compile(r"^\s*(?:[-*•●▪◦·]|\d+[.)])\s+")
+# "2019 - 2021", "Jan 2019 – Present", "2020 to now": marks a role or degree header line
+DATE_RANGE_RE = re.compile(r"(?:19|20)\d{2}\s*(?:-|–|—|to)\s*(?:[a-z]{3,9}\.?\s+)?(?:(?:19|20)\d{2}|present|current|now)\b",
+                           re.I)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+FIELD_RE = re.compile(r"^\s*(job title|title|position|role|company|company name|employer)\s*:\s*(.+)$", re.I)
+WORD_RE = re.compile(r"[a-z0-9+#]+")
+STOPWORDS = {
+    "and", "the", "for", "with", "you", "our", "are", "will", "your", "from", "that", "this", "have",
+    "has", "who", "all", "can", "not", "but", "its", "their", "they", "them", "into", "per", "etc",
+}
+# Keep at least this many items of each list when trimming to the token budget
+MIN_ITEMS = {"skills": 5, "projects": 1, "experience": 2, "education": 1, "requirements": 3, "responsibilities": 2}
+# Longer items are split at sentence ends so fit_to_budget can drop the parts separately
+MAX_ITEM_CHARS = 300
+
+
+def count_tokens(text):
+    # Rough estimate (about 4 characters per token); avoids a tokenizer dependency
+    return len(text) // 4
+
+
+def terms(text):
+    return {word for word in WORD_RE.findall(text.lower()) if len(word) > 2 and word not in STOPWORDS}
+
+
+def heading_of(line, headings):
+    """Returns the section name if line is a heading like 'Skills', 'SKILLS:' or '## Experience'."""
+    stripped = line.strip().strip("#*_ ").rstrip(":").strip().lower()
+    if len(stripped) > 40:
+        return None
+    return headings.get(stripped)
+
+
+def split_sections(text, headings):
+    """Splits text into {section: [lines]}; lines before the first heading go to "header"."""
+    sections = {"header": []}
+    current = "header"
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        section = heading_of(line, headings)
+        if section is not None:
+            current = section
+            sections.setdefault(current, [])
+            continue
+        # "Skills: Python, SQL" puts the heading and its content on one line
+        head, sep, rest = line.partition(":")
+        section = heading_of(head, headings) if sep else None
+        if section is not None and rest.strip():
+            sections.setdefault(section, []).append(rest.strip())
+            continue
+        sections[current].append(line.strip())
+    return sections
+
+
+def split_long(item):
+    """Splits item at sentence ends into parts of up to MAX_ITEM_CHARS; a longer sentence stays whole."""
+    parts = []
+    for sentence in SENTENCE_END_RE.split(item):
+        if parts and len(parts[-1]) + 1 + len(sentence) <= MAX_ITEM_CHARS:
+            parts[-1] += " " + sentence
+        else:
+            parts.append(sentence)
+    return parts
+
+
+def to_items(lines):
+    """
+    Joins wrapped lines into items, starting a new item at every bullet and at
+    role/date header lines. Nothing is cut here: long items are split into
+    sentences and fit_to_budget decides what to drop.
+    """
+    items = []
+    for line in lines:
+        if BULLET_RE.match(line) or DATE_RANGE_RE.search(line) or not items:
+            items.append(BULLET_RE.sub("", line))
+        else:
+            items[-1] += " " + line
+    return [part.strip() for item in items for part in split_long(item.strip()) if part.strip()]
+
+
+def to_skills(lines):
+    skills = []
+    for item in to_items(lines):
+        skills.extend(part.strip() for part in re.split(r"[,;|•]", item) if part.strip())
+    # De-duplicate case-insensitively, keeping the first spelling
+    seen = set()
+    return [s for s in skills if not (s.lower() in seen or seen.add(s.lower()))]
+
+
+def structure_resume(text):
+    """Turns raw resume text into the dict consumed by generate_cover_letter_prompt_structured."""
+    sections = split_sections(text, RESUME_HEADINGS)
+    header = sections["header"]
+    name = next((line for line in header[:3] if 1 < len(line.split()) <= 4
+                 and not EMAIL_RE.search(line) and not PHONE_RE.search(line)), "The Candidate")
+    contact = [m.group(0) for line in header + sections.get("contact", [])
+               for m in (EMAIL_RE.search(line), PHONE_RE.search(line)) if m]
+    return {
+        "name": name,
+        "contact": ", ".join(dict.fromkeys(contact)) or "N/A",
+        "summary": " ".join(sections.get("summary", []))[:MAX_ITEM_CHARS * 2],
+        "skills": to_skills(sections.get("skills", [])),
+        "experience": to_items(sections.get("experience", [])),
+        "projects": to_items(sections.get("projects", [])),
+        "education": to_items(sections.get("education", [])),
+    }
+
+
+def structure_job(text):
+    """Turns raw job description text into the dict consumed by generate_cover_letter_prompt_structured."""
+    sections = split_sections(text, JOB_HEADINGS)
+    fields = {}
+    for line in text.splitlines():
+        match = FIELD_RE.match(line)
+        if match:
+            key = "company" if match.group(1).lower() in ("company", "company name", "employer") else "title"
+            fields.setdefault(key, match.group(2).strip())
+    header = [line for line in sections["header"] if not FIELD_RE.match(line)]
+    if "title" not in fields and header:
+        # The first short line of a posting is almost always the job title
+        fields["title"] = next((line for line in header if len(line.split()) <= 8), header[0][:80])
+    requirements = to_items(sections.get("requirements", []))
+    responsibilities = to_items(sections.get("responsibilities", []))
+    if not requirements and not responsibilities:
+        # No recognizable headings: treat bullet lines as requirements
+        requirements = to_items([line for line in header if BULLET_RE.match(line)])
+    return {
+        "title": fields.get("title", "the advertised position"),
+        "company": fields.get("company", "your esteemed company"),
+        "requirements": requirements,
+        "responsibilities": responsibilities,
+        "about_company": " ".join(sections.get("about_company", []))[:MAX_ITEM_CHARS * 2],
+    }
+
+
+def as_prompt_fields(resume_data):
+    """Flattens a structured resume into the string fields the structured prompt expects."""
+    experience = ([resume_data["summary"]] if resume_data.get("summary") else []) + resume_data["experience"]
+    return dict(resume_data, experience="; ".join(experience) or "N/A",
+                education="; ".join(resume_data["education"]) or "N/A")
+
+
+def is_usable(resume_data, job_data):
+    """True when enough of both texts was recognized to replace them in the prompt."""
+    return bool((resume_data["skills"] or resume_data["experience"])
+                and (job_data["requirements"] or job_data["responsibilities"]))
+
+
+def fit_to_budget(resume_data, job_data, build_prompt, max_tokens):
+    """
+    Drops the least relevant list items until build_prompt(resume, job) fits in
+    max_tokens. Resume items are scored by term overlap with the job, and job
+    items by overlap with the resume, so what survives is what the letter is
+    most likely to connect. Returns trimmed copies and the number of items dropped.
+    """
+    resume = {k: list(v) if isinstance(v, list) else v for k, v in resume_data.items()}
+    job = {k: list(v) if isinstance(v, list) else v for k, v in job_data.items()}
+    job_terms = terms(" ".join([job["title"]] + job["requirements"] + job["responsibilities"]))
+    resume_terms = terms(" ".join(resume["skills"] + resume["experience"] + resume["projects"]))
+
+    candidates = []
+    for data, key, other_terms in ((resume, "skills", job_terms), (resume, "projects", job_terms),
+                                   (resume, "experience", job_terms), (resume, "education", job_terms),
+                                   (job, "requirements", resume_terms),
+                                   (job, "responsibilities", resume_terms)):
+        for item in data[key]:
+            overlap = len(terms(item) & other_terms)
+            candidates.append((overlap, -len(item), key, id(data), item))
+    candidates.sort(key=lambda c: c[:2])
+    owners = {id(resume): resume, id(job): job}
+
+    dropped = 0
+    excess = count_tokens(build_prompt(resume, job)) - max_tokens
+    for _, _, key, owner, item in candidates:
+        if excess <= 0:
+            break
+        data = owners[owner]
+        if len(data[key]) <= MIN_ITEMS[key]:
+            continue
+        data[key].remove(item)
+        excess -= count_tokens(item) + 1
+        dropped += 1
+    return resume, job, dropped
+
+
+class PromptMetrics:
+    """Running totals of prompt tokens saved by structured pre-extraction."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.raw_tokens = 0
+        self.prompt_tokens = 0
+
+    def record(self, raw_tokens, prompt_tokens):
+        with self._lock:
+            self.requests += 1
+            self.raw_tokens += raw_tokens
+            self.prompt_tokens += prompt_tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "unstructured_prompt_tokens": self.raw_tokens,
+                "structured_prompt_tokens": self.prompt_tokens,
+                "reduction": 1 - self.prompt_tokens / self.raw_tokens if self.raw_tokens else 0.0,
+            }
@@ -0,0 +1,85 @@
+"""
+Latency/throughput benchmark of inference.py against the original
+generate_answer() (one question per generate() call, always 250 new tokens).
+
+All questions are submitted at once from --concurrency threads, as concurrent
+requests to a server would be.
+
+    python bench_inference.py --model ./gpt2-legal-finetuned --questions 32
+    python bench_inference.py --csv formatted_legal_qa.csv --quantize
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import preprocessing
+from inference import MODEL_PATH, AnswerGenerator, build_prompt
+
+
+def load_questions(args):
+    if args.csv:
+        from bench_preprocessing import load_csv
+        df = preprocessing.clean_data(load_csv(args.csv))
+    else:
+        df = preprocessing.load_clean_dataset(args.source)
+    return df["question"].sample(args.questions, random_state=0).tolist()
+
+
+def original_answer(tokenizer, model, question, max_new_tokens=250):
+    # The original generate_answer() minus the ignored temperature/top_k
+    inputs = tokenizer(build_prompt(question), return_tensors="pt")
+    with torch.no_grad():
+        outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                 pad_token_id=tokenizer.eos_token_id)
+    return tokenizer.decode(outputs[0], skip_special_tokens=True).split("Answer:")[1].strip()
+
+
+def run(answer_fn, questions, concurrency):
+    """Answers all questions from concurrency threads; returns (seconds, per-question latencies)."""
+    def timed(question):
+        start = time.perf_counter()
+        answer_fn(question)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(timed, questions))
+    return time.perf_counter() - start, latencies
+
+
+def report(name, seconds, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{name:<22} {len(latencies) / seconds:>8.2f} q/s  p50 {statistics.median(latencies):>6.2f}s  "
+          f"p95 {p95:>6.2f}s  total {seconds:>6.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batched GPT-2 inference.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--source", default=preprocessing.SOURCE)
+    parser.add_argument("--csv", help="use a local formatted CSV instead of --source")
+    parser.add_argument("--questions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-new-tokens", type=int, default=250)
+    parser.add_argument("--quantize", action="store_true", help="also run with int8 dynamic quantization")
+    args = parser.parse_args()
+
+    questions = load_questions(args)
+    generator = AnswerGenerator(args.model, max_batch_size=args.max_batch_size, max_new_tokens=args.max_new_tokens)
+
+    # One request at a time, as the single shared model would serve them without batching
+    report("original (serial)", *run(
+        lambda q: original_answer(generator.tokenizer, generator.model, q, args.max_new_tokens), questions, 1))
+    report("micro-batched", *run(generator.answer, questions, args.concurrency))
+    generator.close()
+
+    if args.quantize:
+        quantized = AnswerGenerator(args.model, quantize=True, max_batch_size=args.max_batch_size,
+                                    max_new_tokens=args.max_new_tokens)
+        report("micro-batched int8", *run(quantized.answer, questions, args.concurrency))
+        quantized.close()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the cleaning + formatting stage: the original row-wise
+.apply(clean_text) / .apply(axis=1) path against preprocessing.py, serial
+and multiprocess, and the cached reload. Also checks the outputs are identical.
+
+    python bench_preprocessing.py                       # full open-australian-legal-qa set
+    python bench_preprocessing.py --csv formatted_legal_qa.csv --repeat 10   # offline
+"""
+import argparse
+import os
+import re
+import string
+import tempfile
+import time
+
+import pandas as pd
+
+import preprocessing
+
+
+def legacy_clean_text(text):
+    # The original clean_text from ready_fine_tune_gpt2.py
+    text = text.lower()
+    text = re.sub(r'http\S+|www\S+|https\S+', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\d+', '', text)
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def legacy_path(df):
+    df = df.copy()
+    df['question'] = df['question'].apply(legacy_clean_text)
+    df['answer'] = df['answer'].apply(legacy_clean_text)
+    df["text"] = df.apply(
+        lambda row: f"You are a legal assistant. Read the question and provide a clear and accurate answer.\n\nQuestion: {row['question']}\nAnswer: {row['answer']}",
+        axis=1
+    )
+    return df
+
+
+def load_csv(path):
+    # The formatted CSV holds "Question: ...\nAnswer: ..." strings
+    parts = pd.read_csv(path)["text"].str.split("\nAnswer: ", n=1, expand=True)
+    return pd.DataFrame({"question": parts[0].str.removeprefix("Question: "), "answer": parts[1].fillna("")})
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark QA data cleaning.")
+    parser.add_argument("--source", default=preprocessing.SOURCE)
+    parser.add_argument("--csv", help="use a local formatted CSV instead of --source")
+    parser.add_argument("--repeat", type=int, default=1, help="replicate the rows to scale the input")
+    parser.add_argument("--num-proc", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    df = load_csv(args.csv) if args.csv else preprocessing.load_source(args.source)
+    df = pd.concat([df] * args.repeat, ignore_index=True)
+    print(f"{len(df)} rows, {df['question'].str.len().sum() + df['answer'].str.len().sum()} characters")
+
+    legacy, legacy_s = timed(lambda: legacy_path(df))
+    serial, serial_s = timed(lambda: preprocessing.clean_data(df, num_proc=1).assign(
+        text=lambda d: preprocessing.format_text(d)))
+    parallel, parallel_s = timed(lambda: preprocessing.clean_data(df, num_proc=args.num_proc).assign(
+        text=lambda d: preprocessing.format_text(d)))
+
+    cache_dir = tempfile.mkdtemp()
+    _, cold_s = timed(lambda: preprocessing.load_clean_dataset(cache_dir=cache_dir, num_proc=args.num_proc, df=df))
+    cached, warm_s = timed(lambda: preprocessing.load_clean_dataset(cache_dir=cache_dir, df=df))
+
+    print(f"{'path':<28} {'seconds':>8} {'speedup':>8}")
+    for name, seconds in [("legacy apply", legacy_s), ("vectorized", serial_s),
+                          (f"vectorized, {args.num_proc} procs", parallel_s),
+                          ("cache miss (hash + clean)", cold_s), ("cache hit", warm_s)]:
+        print(f"{name:<28} {seconds:>8.2f} {legacy_s / seconds:>7.1f}x")
+
+    for name, result in [("vectorized", serial), ("parallel", parallel), ("cached", cached)]:
+        same = all(result[col].tolist() == legacy[col].tolist() for col in ("question", "answer", "text"))
+        print(f"{name} output identical to legacy: {same}")
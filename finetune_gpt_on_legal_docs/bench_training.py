@@ -0,0 +1,87 @@
+"""
+CPU benchmark of the training data strategies in training_data.py.
+
+Trains one epoch over a sample of the cleaned QA set with each strategy (the
+Trainer's own dataloader, so length grouping and gradient accumulation apply)
+and reports real (non-pad) tokens per second, the share of padding, and the
+epoch time projected to the full training split.
+
+    python bench_training.py --rows 200
+    python bench_training.py --csv formatted_legal_qa.csv --model distilgpt2 --rows 100
+"""
+import argparse
+import tempfile
+import time
+
+import torch
+from datasets import Dataset
+from transformers import AutoModelForCausalLM, AutoTokenizer, Trainer, TrainingArguments
+
+import preprocessing
+from training_data import BLOCK_SIZE, STRATEGIES, build_lm_dataset, collator_for, training_settings
+
+
+def load_texts(args):
+    if args.csv:
+        from bench_preprocessing import load_csv
+        df = preprocessing.clean_data(load_csv(args.csv))
+        df["text"] = preprocessing.format_text(df)
+    else:
+        df = preprocessing.load_clean_dataset(args.source)
+    return Dataset.from_pandas(df[["text"]], preserve_index=False)
+
+
+def train_epoch(model, dataloader, accumulation):
+    """Runs one epoch; returns (seconds, batches, real tokens, total tokens)."""
+    optimizer = torch.optim.AdamW(model.parameters(), lr=5e-5)
+    model.train()
+    real = total = batches = 0
+    start = time.perf_counter()
+    for batches, batch in enumerate(dataloader, 1):
+        loss = model(**batch).loss / accumulation
+        loss.backward()
+        if batches % accumulation == 0:
+            optimizer.step()
+            optimizer.zero_grad()
+        real += int(batch["attention_mask"].sum())
+        total += batch["input_ids"].numel()
+    return time.perf_counter() - start, batches, real, total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark GPT-2 training data strategies on CPU.")
+    parser.add_argument("--source", default=preprocessing.SOURCE)
+    parser.add_argument("--csv", help="use a local formatted CSV instead of --source")
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--rows", type=int, default=200, help="training examples per epoch")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=STRATEGIES)
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    tokenizer.pad_token = tokenizer.eos_token
+    texts = load_texts(args)
+    # The same 90% train split as the training script
+    train_rows = int(len(texts) * 0.9)
+    sample = texts.shuffle(seed=0).select(range(args.rows))
+
+    results = {}
+    for strategy in args.strategies:
+        dataset = build_lm_dataset(sample, tokenizer, strategy, args.block_size)
+        settings = training_settings(strategy)
+        torch.manual_seed(0)
+        model = AutoModelForCausalLM.from_pretrained(args.model)
+        with tempfile.TemporaryDirectory() as output_dir:
+            trainer = Trainer(model=model, args=TrainingArguments(output_dir=output_dir, report_to=[], **settings),
+                              train_dataset=dataset, data_collator=collator_for(strategy, tokenizer))
+            dataloader = trainer.get_train_dataloader()
+        seconds, batches, real, total = train_epoch(model, dataloader, settings["gradient_accumulation_steps"])
+        results[strategy] = seconds
+        print(f"{strategy:<8} batch {settings['per_device_train_batch_size']:>2} x accum "
+              f"{settings['gradient_accumulation_steps']}: {batches} batches, {real} real tokens, "
+              f"{1 - real / total:.0%} padding, {seconds:.1f}s, {real / seconds:.0f} tokens/s, "
+              f"full epoch ~{seconds * train_rows / args.rows / 60:.0f} min")
+
+    if "padded" in results:
+        for strategy, seconds in results.items():
+            print(f"{strategy:<8} epoch speedup vs padded: {results['padded'] / seconds:.1f}x")
@@ -0,0 +1,178 @@
+"""
+Evaluates a fine-tuned model on the whole test split and writes a JSON report.
+
+    python evaluate_model.py --model ./gpt2-legal-finetuned --output eval_report.json
+    python evaluate_model.py --config train_config.yaml --max-examples 200
+
+- Answers are generated in batches (inference.AnswerGenerator: left padding,
+  KV cache, stop at the next "Question:").
+- BLEU (evaluate's "bleu", corpus level, as in the notebook) and ROUGE-1/2/L
+  F1 (rouge_score, mean over examples, no stemming) are computed in worker
+  processes, while the main process computes perplexity.
+- Perplexity uses a sliding window: each window scores only the tokens the
+  previous one did not, with up to max_length - stride tokens of context.
+  The total NLL is divided by the number of tokens actually scored. The
+  notebook's compute_perplexity() divided by end_loc, which overshoots the
+  text length in the last window. Windows from all texts are batched
+  together under inference_mode.
+"""
+import argparse
+import json
+import math
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import evaluate
+import torch
+import torch.nn.functional as F
+from rouge_score import rouge_scorer
+
+from inference import MODEL_PATH, AnswerGenerator
+from train import load_config, load_splits
+
+ROUGE_TYPES = ("rouge1", "rouge2", "rougeL")
+
+
+def bleu_score(predictions, references):
+    """Runs in a worker process: corpus BLEU (evaluate's "bleu", up to 4-grams) over all pairs."""
+    return evaluate.load("bleu").compute(predictions=predictions, references=[[r] for r in references])
+
+
+def rouge_chunk(pairs):
+    """Runs in a worker process: summed ROUGE-1/2/L F1 over a chunk of (prediction, reference) pairs."""
+    scorer = rouge_scorer.RougeScorer(ROUGE_TYPES)
+    totals = Counter()
+    for prediction, reference in pairs:
+        totals.update({key: score.fmeasure for key, score in scorer.score(reference, prediction).items()})
+    return totals
+
+
+def submit_text_metrics(pool, predictions, references, chunks):
+    # Corpus BLEU needs every pair at once; ROUGE is a per-example mean, so it is split
+    pairs = list(zip(predictions, references))
+    size = -(-len(pairs) // chunks)
+    bleu = pool.submit(bleu_score, predictions, references)
+    return bleu, [pool.submit(rouge_chunk, pairs[i:i + size]) for i in range(0, len(pairs), size)]
+
+
+def collect_text_metrics(futures, n_examples):
+    bleu, rouge_futures = futures
+    rouge = Counter()
+    for future in rouge_futures:
+        rouge.update(future.result())
+    return bleu.result(), {key: rouge[key] / n_examples for key in ROUGE_TYPES}
+
+
+def generate_answers(generator, questions, batch_size=16):
+    """Batched generation; questions are grouped by length so batches carry little padding."""
+    order = sorted(range(len(questions)), key=lambda i: len(questions[i]))
+    answers = [None] * len(questions)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        for i, answer in zip(batch, generator.generate_batch([questions[i] for i in batch])):
+            answers[i] = answer
+    return answers
+
+
+def sliding_windows(ids, max_length, stride):
+    """Yields (window ids, number of scored tokens at its end) covering ids."""
+    prev_end = 0
+    for begin in range(0, len(ids), stride):
+        end = min(begin + max_length, len(ids))
+        yield ids[begin:end], end - prev_end
+        prev_end = end
+        if end == len(ids):
+            break
+
+
+def perplexity(model, tokenizer, texts, stride=512, max_batch_tokens=4096):
+    """Corpus perplexity of texts: exp(total NLL / tokens scored)."""
+    max_length = model.config.n_positions
+    windows = [window for text in texts
+               for window in sliding_windows(tokenizer(text)["input_ids"], max_length, stride)]
+    windows.sort(key=lambda window: len(window[0]))
+
+    total_nll, total_tokens = 0.0, 0
+    start = 0
+    while start < len(windows):
+        # Windows are sorted, so the last one in a batch is the longest
+        stop = start + 1
+        while stop < len(windows) and (stop - start + 1) * len(windows[stop][0]) <= max_batch_tokens:
+            stop += 1
+        batch = windows[start:stop]
+        start = stop
+
+        longest = len(batch[-1][0])
+        input_ids = torch.full((len(batch), longest), tokenizer.eos_token_id, dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        labels = torch.full_like(input_ids, -100)
+        for row, (ids, n_scored) in enumerate(batch):
+            input_ids[row, :len(ids)] = torch.tensor(ids)
+            attention_mask[row, :len(ids)] = 1
+            labels[row, len(ids) - n_scored:len(ids)] = torch.tensor(ids[len(ids) - n_scored:])
+        with torch.inference_mode():
+            logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+        # Position t predicts token t + 1; a text's first token is never scored
+        targets = labels[:, 1:]
+        total_nll += F.cross_entropy(logits[:, :-1].float().reshape(-1, logits.size(-1)), targets.reshape(-1),
+                                     ignore_index=-100, reduction="sum").item()
+        total_tokens += int((targets != -100).sum())
+    return math.exp(total_nll / total_tokens), total_tokens
+
+
+def evaluate_split(generator, split, batch_size=16, stride=512, workers=None):
+    """Scores a split with 'question', 'answer' and prompt-formatted 'text' columns; returns the report dict."""
+    questions, references = list(split["question"]), list(split["answer"])
+    started = time.perf_counter()
+    predictions = generate_answers(generator, questions, batch_size)
+    generation_seconds = time.perf_counter() - started
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        # BLEU/ROUGE run in the pool while perplexity runs here
+        futures = submit_text_metrics(pool, predictions, references, workers)
+        started = time.perf_counter()
+        ppl, scored_tokens = perplexity(generator.model, generator.tokenizer, list(split["text"]), stride)
+        perplexity_seconds = time.perf_counter() - started
+        bleu, rouge = collect_text_metrics(futures, len(questions))
+
+    return {
+        "examples": len(questions),
+        "bleu": bleu,
+        "rouge": rouge,
+        "perplexity": ppl,
+        "perplexity_tokens": scored_tokens,
+        "seconds": {"generation": generation_seconds, "perplexity": perplexity_seconds},
+        "samples": [{"question": q, "reference": r, "prediction": p}
+                    for q, r, p in list(zip(questions, references, predictions))[:5]],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate a fine-tuned model on the legal QA test split.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--config", help="training config, for the data source and the test split")
+    parser.add_argument("--source", help="dataset path or hf:// URL (JSON lines with question/answer)")
+    parser.add_argument("--max-examples", type=int, help="evaluate only the first N test examples")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-new-tokens", type=int, default=250)
+    parser.add_argument("--stride", type=int, default=512)
+    parser.add_argument("--workers", type=int, default=None, help="metric processes (default: CPU count)")
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic quantization (CPU)")
+    parser.add_argument("--output", default="eval_report.json")
+    args = parser.parse_args()
+
+    config = load_config(args.config, {"source": args.source})
+    split = load_splits(config)[0]["test"]
+    if args.max_examples:
+        split = split.select(range(min(args.max_examples, len(split))))
+
+    generator = AnswerGenerator(args.model, quantize=args.quantize, max_new_tokens=args.max_new_tokens)
+    report = {"model": args.model, "quantized": args.quantize, **evaluate_split(
+        generator, split, args.batch_size, args.stride, args.workers)}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{report['examples']} examples: BLEU {report['bleu']['bleu']:.4f}, "
+          f"ROUGE-L {report['rouge']['rougeL']:.4f}, perplexity {report['perplexity']:.2f}")
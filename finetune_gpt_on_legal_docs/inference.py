@@ -0,0 +1,201 @@
+"""
+Answer generation with the fine-tuned model, loaded once per process.
+
+Concurrent questions are grouped into micro-batches: the first question waits
+up to max_wait_ms for others (up to max_batch_size), and the batch is run as
+one left-padded generate() call with the KV cache. Generation stops at EOS or
+when the model starts a new "Question:", instead of always running
+max_new_tokens. Decoding is greedy unless a temperature is given; the original
+generate_answer() passed temperature/top_k with do_sample=False, where they
+have no effect.
+
+    python inference.py --port 8000 [--quantize]
+    curl -d '{"question": "..."}' localhost:8000/answer
+"""
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers.pytorch_utils import Conv1D
+
+from preprocessing import PROMPT_PREFIX
+
+MODEL_PATH = "./gpt2-legal-finetuned"
+STOP_STRING = "Question:"
+
+
+def build_prompt(question):
+    return f"{PROMPT_PREFIX}Question: {question}\nAnswer:"
+
+
+def conv1d_to_linear(module):
+    """
+    Replaces GPT-2's Conv1D layers (Linear with a transposed weight) with
+    nn.Linear in place, so dynamic quantization recognizes them.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            n_in, n_out = child.weight.shape
+            linear = torch.nn.Linear(n_in, n_out)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            conv1d_to_linear(child)
+    return module
+
+
+def load_model(model_path=MODEL_PATH, quantize=False):
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer.pad_token = tokenizer.eos_token
+    # Left padding keeps every prompt's last token at the end of the row, where generation continues
+    tokenizer.padding_side = "left"
+    model = AutoModelForCausalLM.from_pretrained(model_path)
+    model.eval()
+    if quantize:
+        # int8 weights for the Linear layers; activations stay float (CPU only)
+        model = torch.ao.quantization.quantize_dynamic(conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+class AnswerGenerator:
+    """Generates answers in batches, directly or through a micro-batching worker thread."""
+
+    def __init__(self, model_path=MODEL_PATH, quantize=False, max_batch_size=8, max_wait_ms=10,
+                 max_new_tokens=250, temperature=None, top_k=None):
+        self.tokenizer, self.model = load_model(model_path, quantize)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_k = top_k
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def generation_kwargs(self):
+        kwargs = {
+            "max_new_tokens": self.max_new_tokens,
+            "pad_token_id": self.tokenizer.eos_token_id,
+            "stop_strings": [STOP_STRING],
+            "tokenizer": self.tokenizer,
+            "use_cache": True,
+        }
+        if self.temperature:
+            kwargs.update(do_sample=True, temperature=self.temperature, top_k=self.top_k)
+        else:
+            kwargs.update(do_sample=False, temperature=None, top_k=None, top_p=None)
+        return kwargs
+
+    def generate_batch(self, questions):
+        """Returns one answer per question, generated as a single batch."""
+        inputs = self.tokenizer([build_prompt(q) for q in questions], return_tensors="pt", padding=True)
+        with torch.inference_mode():
+            outputs = self.model.generate(**inputs, **self.generation_kwargs())
+        # Only the new tokens; the prompts all end at the same (left-padded) position
+        texts = self.tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+        return [text.split(STOP_STRING)[0].strip() for text in texts]
+
+    def submit(self, question):
+        """Queues a question for the next micro-batch; returns a Future for the answer."""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+        future = Future()
+        self._queue.put((question, future))
+        return future
+
+    def answer(self, question, timeout=None):
+        return self.submit(question).result(timeout)
+
+    def _next_batch(self):
+        """Blocks for the first item, then collects more until max_wait or max_batch_size."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Put the shutdown marker back for the next loop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            batch = [(question, future) for question, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                answers = self.generate_batch([question for question, _ in batch])
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+            else:
+                for (_, future), answer in zip(batch, answers):
+                    future.set_result(answer)
+
+    def close(self):
+        """Stops the worker after the batches already queued."""
+        with self._lock:
+            if self._worker is not None:
+                self._queue.put(None)
+                self._worker.join()
+                self._worker = None
+
+
+def make_handler(generator):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/answer":
+                self.send_error(404)
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                question = payload["question"]
+            except (ValueError, KeyError, TypeError):
+                self.send_error(400, "Expected a JSON body with a 'question' field")
+                return
+            body = json.dumps({"answer": generator.answer(question)}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve answers from the fine-tuned legal GPT-2.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic quantization (CPU)")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=250)
+    args = parser.parse_args()
+
+    generator = AnswerGenerator(args.model, quantize=args.quantize, max_batch_size=args.max_batch_size,
+                                max_wait_ms=args.max_wait_ms, max_new_tokens=args.max_new_tokens)
+    # One thread per connection; the generator batches their questions together
+    ThreadingHTTPServer(("", args.port), make_handler(generator)).serve_forever()
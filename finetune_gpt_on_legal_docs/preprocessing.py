@@ -0,0 +1,100 @@
+"""
+Cleaning and prompt formatting for the legal QA fine-tuning data.
+
+Produces the same text as the original row-by-row clean_text(): lowercase,
+then URLs, numbers and punctuation removed, then whitespace collapsed. The
+removals are one precompiled alternation applied with pandas .str ops,
+optionally split across processes. Cleaned frames are cached as parquet,
+keyed by a hash of the source data and the cleaning version.
+"""
+import hashlib
+import os
+import re
+import string
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+
+SOURCE = "hf://datasets/isaacus/open-australian-legal-qa/qa.jsonl"
+PROMPT_PREFIX = "You are a legal assistant. Read the question and provide a clear and accurate answer.\n\n"
+# Bump when the cleaning rules change so cached outputs are not reused
+CLEANING_VERSION = "1"
+
+# URLs first in the alternation, so they are removed whole before their digits/punctuation
+REMOVE_RE = re.compile(r"http\S+|www\S+|https\S+|\d+|[" + re.escape(string.punctuation) + "]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def clean_text(text):
+    """Cleans a single string; same result as clean_series on a one-element series."""
+    return WHITESPACE_RE.sub(" ", REMOVE_RE.sub("", text.lower())).strip()
+
+
+def _clean_chunk(series):
+    # Object dtype and compiled patterns keep Python semantics even when pandas
+    # stores strings in Arrow: Arrow's lower() ignores the final-sigma rule and
+    # its RE2 engine matches only ASCII for \d and \s
+    return (
+        series.astype(object).str.lower()
+        .str.replace(REMOVE_RE, "", regex=True)
+        .str.replace(WHITESPACE_RE, " ", regex=True)
+        .str.strip()
+    )
+
+
+def clean_series(series, num_proc=1):
+    """Cleans a string series, in num_proc worker processes when num_proc > 1."""
+    if num_proc <= 1 or len(series) < 2 * num_proc:
+        return _clean_chunk(series)
+    chunks = np.array_split(np.arange(len(series)), num_proc)
+    with Pool(num_proc) as pool:
+        parts = pool.map(_clean_chunk, [series.iloc[idx] for idx in chunks])
+    return pd.concat(parts)
+
+
+def clean_data(df, num_proc=1):
+    """Applies the cleaning to the 'question' and 'answer' columns of a copy of df."""
+    df = df[["question", "answer"]].copy()
+    df["question"] = clean_series(df["question"], num_proc)
+    df["answer"] = clean_series(df["answer"], num_proc)
+    return df
+
+
+def format_text(df, with_prompt=True):
+    """Builds the training string for every row with column-wise concatenation."""
+    text = "Question: " + df["question"].str.strip() + "\nAnswer: " + df["answer"].str.strip()
+    return PROMPT_PREFIX + text if with_prompt else text
+
+
+def source_hash(df):
+    """Content hash of the question/answer columns, independent of where they were loaded from."""
+    row_hashes = pd.util.hash_pandas_object(df[["question", "answer"]], index=False).values
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()[:16]
+
+
+def load_source(source=SOURCE):
+    # Login using e.g. `huggingface-cli login` to access this dataset
+    df = pd.read_json(source, lines=True)
+    return df[["question", "answer"]]
+
+
+def load_clean_dataset(source=SOURCE, cache_dir="data_cache", num_proc=None, df=None):
+    """
+    Returns a DataFrame with cleaned 'question', 'answer' and the prompt-formatted 'text'.
+    The result is cached under cache_dir by the hash of the source rows, so
+    reruns skip the cleaning (and reruns with a changed source redo it).
+    """
+    if df is None:
+        df = load_source(source)
+    num_proc = num_proc or os.cpu_count() or 1
+    path = os.path.join(cache_dir, f"clean_{source_hash(df)}_v{CLEANING_VERSION}.parquet")
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    cleaned_df = clean_data(df, num_proc)
+    cleaned_df["text"] = format_text(cleaned_df)
+    os.makedirs(cache_dir, exist_ok=True)
+    cleaned_df.to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return cleaned_df
@@ -0,0 +1,201 @@
+"""
+Fine-tunes GPT-2 on the cleaned legal QA data.
+
+    python train.py                          # defaults below
+    python train.py --config train_config.yaml --epochs 3
+    python train.py --smoke                  # distilgpt2 on 200 rows, minutes on CPU
+
+Settings come from DEFAULT_CONFIG, then the YAML file, then the --smoke
+preset, then command-line flags. Tokenized splits are saved as Arrow under
+cache_dir, keyed by the data, tokenizer and tokenization settings, and are
+memory-mapped on later runs instead of re-tokenized. Training resumes from
+the last checkpoint in output_dir unless --no-resume is given.
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import torch
+import yaml
+from datasets import Dataset, DatasetDict, load_from_disk
+from transformers import AutoModelForCausalLM, AutoTokenizer, Trainer, TrainingArguments, set_seed
+from transformers.trainer_utils import get_last_checkpoint
+
+from preprocessing import CLEANING_VERSION, SOURCE, load_clean_dataset, source_hash
+from training_data import STRATEGIES, build_lm_dataset, collator_for, training_settings
+
+DEFAULT_CONFIG = {
+    "model": "gpt2",
+    "source": SOURCE,
+    "output_dir": "./gpt2-legal-finetuned",
+    "cache_dir": "data_cache",
+    "max_rows": None,
+    "test_size": 0.1,
+    "seed": 42,
+    "strategy": "packed",
+    "block_size": 512,
+    "num_proc": None,
+    # None keeps the per-strategy settings from training_data.BATCH_SETTINGS
+    "batch_size": None,
+    "grad_accum": None,
+    "eval_batch_size": 4,
+    "learning_rate": 5e-5,
+    "epochs": 10,
+    "max_steps": None,
+    "logging_steps": 10,
+    "save_strategy": "epoch",
+    "save_steps": 500,
+    "save_total_limit": 2,
+    "resume": True,
+}
+SMOKE_CONFIG = {
+    "model": "distilgpt2",
+    "output_dir": "./smoke-run",
+    "max_rows": 200,
+    "block_size": 128,
+    "epochs": 1,
+    "logging_steps": 1,
+}
+
+
+def load_config(path=None, overrides=None, smoke=False):
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path) as f:
+            config.update(yaml.safe_load(f) or {})
+    if smoke:
+        config.update(SMOKE_CONFIG)
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(sorted(unknown))}")
+    if config["strategy"] not in STRATEGIES:
+        raise ValueError(f"strategy must be one of {STRATEGIES}")
+    return config
+
+
+def load_splits(config, df=None):
+    """
+    Cleaned, prompt-formatted texts split into 'train' and 'test'. df is an
+    already loaded load_clean_dataset() frame; without it the data is loaded.
+    """
+    if df is None:
+        df = load_clean_dataset(config["source"], cache_dir=config["cache_dir"], num_proc=config["num_proc"])
+    if config["max_rows"]:
+        df = df.head(config["max_rows"])
+    dataset = Dataset.from_pandas(df[["question", "answer", "text"]], preserve_index=False)
+    return dataset.train_test_split(test_size=config["test_size"], seed=config["seed"]), source_hash(df)
+
+
+def tokenized_cache_path(config, data_hash, tokenizer):
+    key = json.dumps({
+        "data": data_hash,
+        "cleaning": CLEANING_VERSION,
+        "tokenizer": tokenizer.name_or_path,
+        "vocab_size": len(tokenizer),
+        **{name: config[name] for name in ("test_size", "seed", "strategy", "block_size")},
+    }, sort_keys=True)
+    return os.path.join(config["cache_dir"], f"tokenized_{hashlib.sha256(key.encode()).hexdigest()[:16]}")
+
+
+def load_tokenized(splits, data_hash, tokenizer, config):
+    """
+    Returns the tokenized splits, memory-mapped from the Arrow cache. They are
+    built and saved first when the cache has no entry for these settings.
+    """
+    path = tokenized_cache_path(config, data_hash, tokenizer)
+    if not os.path.isdir(path):
+        tokenized = DatasetDict({
+            name: build_lm_dataset(split.select_columns(["text"]), tokenizer, config["strategy"],
+                                   config["block_size"], config["num_proc"])
+            for name, split in splits.items()
+        })
+        # Saved under a temporary name so an interrupted save is never loaded
+        tokenized.save_to_disk(path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return load_from_disk(path)
+
+
+def build_trainer(config, tokenizer, tokenized):
+    settings = training_settings(config["strategy"])
+    if config["batch_size"]:
+        settings["per_device_train_batch_size"] = config["batch_size"]
+    if config["grad_accum"]:
+        settings["gradient_accumulation_steps"] = config["grad_accum"]
+    args = TrainingArguments(
+        output_dir=config["output_dir"],
+        num_train_epochs=config["epochs"],
+        max_steps=config["max_steps"] or -1,
+        learning_rate=config["learning_rate"],
+        per_device_eval_batch_size=config["eval_batch_size"],
+        logging_steps=config["logging_steps"],
+        save_strategy=config["save_strategy"],
+        save_steps=config["save_steps"],
+        save_total_limit=config["save_total_limit"],
+        eval_strategy=config["save_strategy"],
+        eval_steps=config["save_steps"],
+        seed=config["seed"],
+        fp16=torch.cuda.is_available(),
+        report_to="none",
+        **settings,
+    )
+    model = AutoModelForCausalLM.from_pretrained(config["model"])
+    return Trainer(
+        model=model,
+        args=args,
+        train_dataset=tokenized["train"],
+        eval_dataset=tokenized["test"],
+        processing_class=tokenizer,
+        data_collator=collator_for(config["strategy"], tokenizer),
+    )
+
+
+def run(config, df=None):
+    """
+    Trains and saves the model; returns the trainer and the text splits.
+    df is passed on to load_splits, so callers that already hold the cleaned
+    data do not load it again.
+    """
+    set_seed(config["seed"])
+    tokenizer = AutoTokenizer.from_pretrained(config["model"])
+    tokenizer.pad_token = tokenizer.eos_token  # GPT-2 has no pad token
+    splits, data_hash = load_splits(config, df)
+    tokenized = load_tokenized(splits, data_hash, tokenizer, config)
+    print(f"train: {len(tokenized['train'])} sequences, test: {len(tokenized['test'])} sequences")
+
+    trainer = build_trainer(config, tokenizer, tokenized)
+    checkpoint = None
+    if config["resume"] and os.path.isdir(config["output_dir"]):
+        checkpoint = get_last_checkpoint(config["output_dir"])
+    if checkpoint:
+        print(f"Resuming from {checkpoint}")
+    trainer.train(resume_from_checkpoint=checkpoint)
+
+    trainer.save_model(config["output_dir"])
+    tokenizer.save_pretrained(config["output_dir"])
+    return trainer, splits
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fine-tune GPT-2 on the legal QA dataset.")
+    parser.add_argument("--config", help="YAML file with keys from DEFAULT_CONFIG")
+    parser.add_argument("--smoke", action="store_true", help="tiny run: distilgpt2 on 200 rows, one epoch")
+    parser.add_argument("--model")
+    parser.add_argument("--source", help="dataset path or hf:// URL (JSON lines with question/answer)")
+    parser.add_argument("--output-dir")
+    parser.add_argument("--cache-dir")
+    parser.add_argument("--max-rows", type=int)
+    parser.add_argument("--strategy", choices=STRATEGIES)
+    parser.add_argument("--block-size", type=int)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--grad-accum", type=int)
+    parser.add_argument("--learning-rate", type=float)
+    parser.add_argument("--epochs", type=float)
+    parser.add_argument("--max-steps", type=int)
+    parser.add_argument("--no-resume", dest="resume", action="store_const", const=False,
+                        help="start over even if output_dir has checkpoints")
+    args = vars(parser.parse_args())
+
+    config_path, smoke = args.pop("config"), args.pop("smoke")
+    run(load_config(config_path, args, smoke=smoke))
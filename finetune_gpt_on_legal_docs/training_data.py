@@ -0,0 +1,112 @@
+"""
+Tokenization, batching and batch-size settings for GPT-2 fine-tuning.
+
+Three strategies for turning the 'text' column into training batches:
+
+    padded   the original path: every example padded to block_size, batch size 1
+    dynamic  no static padding; batches of similar-length examples padded only
+             to their longest member
+    packed   examples joined with EOS and cut into full block_size blocks, so no
+             position is spent on padding
+
+Most QA pairs are a few hundred tokens, so "padded" spends most of its compute
+on pad tokens. bench_training.py measures the difference.
+"""
+from itertools import chain
+
+import torch
+from transformers import DataCollatorForLanguageModeling, TrainingArguments
+
+STRATEGIES = ("padded", "dynamic", "packed")
+BLOCK_SIZE = 512
+
+# Per-device batch size and gradient accumulation per strategy. The dynamic and
+# packed settings both update on roughly 8-10k real tokens per optimizer step.
+BATCH_SETTINGS = {
+    "padded": {"per_device_train_batch_size": 1, "gradient_accumulation_steps": 1},
+    "dynamic": {"per_device_train_batch_size": 16, "gradient_accumulation_steps": 4},
+    "packed": {"per_device_train_batch_size": 4, "gradient_accumulation_steps": 4},
+}
+
+
+def pack_blocks(batch, block_size=BLOCK_SIZE):
+    """
+    Concatenates the token ids of a batch of examples and splits them into
+    block_size blocks. The tail that does not fill a block is dropped (at most
+    one block per map batch). Blocks can span example boundaries; the EOS
+    between examples marks where one QA pair ends.
+    """
+    concatenated = list(chain.from_iterable(batch["input_ids"]))
+    usable = len(concatenated) // block_size * block_size
+    blocks = [concatenated[i:i + block_size] for i in range(0, usable, block_size)]
+    return {"input_ids": blocks, "length": [block_size] * len(blocks)}
+
+
+def build_lm_dataset(dataset, tokenizer, strategy="packed", block_size=BLOCK_SIZE, num_proc=None):
+    """Tokenizes a datasets.Dataset with a 'text' column for causal LM training."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}; expected one of {STRATEGIES}")
+
+    if strategy == "padded":
+        def tokenize_padded(batch):
+            return tokenizer(batch["text"], padding="max_length", truncation=True, max_length=block_size)
+        return dataset.map(tokenize_padded, batched=True, remove_columns=dataset.column_names, num_proc=num_proc)
+
+    eos = tokenizer.eos_token_id
+
+    def tokenize(batch):
+        # EOS after every answer, so the model learns where an answer ends
+        ids = tokenizer(batch["text"], truncation=True, max_length=block_size - 1)["input_ids"]
+        ids = [example + [eos] for example in ids]
+        # 'length' lets the length-grouped sampler skip re-measuring every example
+        return {"input_ids": ids, "length": [len(example) for example in ids]}
+
+    tokenized = dataset.map(tokenize, batched=True, remove_columns=dataset.column_names, num_proc=num_proc)
+    if strategy == "dynamic":
+        return tokenized
+    return tokenized.map(pack_blocks, batched=True, batch_size=1000, fn_kwargs={"block_size": block_size},
+                         remove_columns=tokenized.column_names, num_proc=num_proc)
+
+
+class DynamicPaddingCollator:
+    """
+    Pads each batch to its longest sequence, rounded up to pad_to_multiple_of.
+    Labels are masked with -100 from the attention mask rather than by pad
+    token id: GPT-2 pads with EOS, so masking by id would also hide the real
+    EOS at the end of every answer.
+    """
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        longest = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            longest = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        input_ids = torch.full((len(features), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), longest), dtype=torch.long)
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[i, :n] = torch.as_tensor(f["input_ids"], dtype=torch.long)
+            attention_mask[i, :n] = 1
+        labels = input_ids.masked_fill(attention_mask == 0, -100)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+def collator_for(strategy, tokenizer):
+    if strategy == "padded":
+        return DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    return DynamicPaddingCollator(tokenizer.pad_token_id)
+
+
+def training_settings(strategy):
+    """TrainingArguments keyword arguments for the batch shape of a strategy."""
+    settings = dict(BATCH_SETTINGS[strategy])
+    if strategy == "dynamic":
+        # Renamed in transformers 5
+        if "train_sampling_strategy" in TrainingArguments.__dataclass_fields__:
+            settings["train_sampling_strategy"] = "group_by_length"
+        else:
+            settings["group_by_length"] = True
+    return settings
@@ -0,0 +1,105 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Caches answers by the embedding of the standalone question.
+
+    A lookup embeds the question once with the app's embedding model and
+    compares it against every cached question with a single matrix-vector
+    product; the best match above the similarity threshold is a hit. Entries
+    expire after ttl seconds, and the whole cache is dropped when the version
+    of the document index it was built against changes.
+    """
+
+    def __init__(self, embeddings, threshold=0.92, ttl=3600, max_entries=1000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index_version = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries = []  # (question, answer, created_at), aligned with _vectors rows
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, question):
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self, index_version):
+        if index_version != self.index_version:
+            self._clear()
+            self.index_version = index_version
+
+    def _clear(self):
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._entries = []
+
+    def _drop(self, keep_mask):
+        self._vectors = self._vectors[keep_mask]
+        self._entries = [entry for entry, keep in zip(self._entries, keep_mask) if keep]
+
+    def lookup(self, question, index_version=None, vector=None):
+        """
+        Returns (answer, similarity, vector) on a hit, or (None, best_similarity, vector).
+        The vector can be passed back to store() to avoid embedding twice.
+        """
+        if vector is None:
+            vector = self._embed(question)
+        with self._lock:
+            self._check_version(index_version)
+            if not self._entries:
+                self.misses += 1
+                return None, 0.0, vector
+
+            now = time.time()
+            fresh = np.array([now - created_at < self.ttl for _, _, created_at in self._entries])
+            if not fresh.all():
+                self._drop(fresh)
+                if not self._entries:
+                    self.misses += 1
+                    return None, 0.0, vector
+
+            similarities = self._vectors @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity >= self.threshold:
+                self.hits += 1
+                return self._entries[best][1], similarity, vector
+            self.misses += 1
+            return None, similarity, vector
+
+    def store(self, question, answer, index_version=None, vector=None):
+        if vector is None:
+            vector = self._embed(question)
+        with self._lock:
+            self._check_version(index_version)
+            if not self._entries:
+                self._vectors = vector[np.newaxis, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector])
+            self._entries.append((question, answer, time.time()))
+            if len(self._entries) > self.max_entries:
+                # Entries are appended in time order, so the front is the oldest
+                overflow = len(self._entries) - self.max_entries
+                keep = np.arange(len(self._entries)) >= overflow
+                self._drop(keep)
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
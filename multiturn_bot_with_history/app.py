@@ -1,18 +1,27 @@
+import os
+import sys
 import streamlit as st
-from langchain.chains import create_history_aware_retriever, create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_community.vectorstores import FAISS
-from langchain_community.chat_message_histories import ChatMessageHistory
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import RunnablePassthrough
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_groq import ChatGroq
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader
 from dotenv import load_dotenv
-import os
-import datetime
-import csv
+from index_manager import load_index
+# resource_registry.py is shared by the apps in this repository and lives in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from resource_registry import registry
+from streaming import StreamMetrics, stream_answer
+from answer_cache import SemanticAnswerCache
+from question_rewriter import QuestionRewriter
+from history_store import create_history_store
+from interaction_log import InteractionLogger
+from hybrid_retriever import HybridRetriever, load_cross_encoder, CROSS_ENCODER_MODEL
+import re
 import uuid
 
 if 'user_id' not in st.session_state:
@@ -24,41 +33,130 @@ user_id = st.session_state.user_id
 load_dotenv()
 os.environ['HF_TOKEN'] = os.getenv("HF_TOKEN")
 
-# Initialize embeddings
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+LLM_MODEL = "Gemma2-9b-It"
+
+# Models and the index live in a process-wide registry, so every session and
+# rerun shares one copy instead of loading its own
+def load_embeddings(model_name):
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+def warmup_embeddings(model):
+    model.embed_query("warmup")
+
+def get_embeddings():
+    return registry.get("hf-embeddings", load_embeddings, config={"model_name": EMBEDDING_MODEL},
+                        warmup=warmup_embeddings)
+
+# One client per API key; without a cap every key ever entered would stay cached
+MAX_LLM_CLIENTS = int(os.getenv("MAX_LLM_CLIENTS", 8))
+
+def get_llm(groq_api_key):
+    return registry.get("chat-groq", ChatGroq, config={"groq_api_key": groq_api_key, "model_name": LLM_MODEL},
+                        size_mb=0, max_entries=MAX_LLM_CLIENTS)
+
+# Chunking used when (re-)embedding documents; changing it re-splits the corpus
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 400))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 80))
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", 4))
+USE_RERANKER = os.getenv("USE_RERANKER", "0") == "1"
+# flat, ivf_flat, ivf_pq or hnsw; approximate types pay off for large corpora.
+# Unset keeps the type of the saved index (e.g. one built by ingest.py), or flat
+INDEX_TYPE = os.getenv("INDEX_TYPE")
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0") == "1"
+
+def get_index_manager():
+    return registry.get(
+        "faiss-index",
+        lambda docs_dir, index_dir, chunk_size, chunk_overlap, index_type, mmap: load_index(
+            get_embeddings(), docs_dir=docs_dir, index_dir=index_dir,
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, index_type=index_type, mmap=mmap,
+        ),
+        config={"docs_dir": "docs", "index_dir": "faiss_index",
+                "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+                "index_type": INDEX_TYPE, "mmap": INDEX_MMAP},
+        size_mb=0,
+    )
+
+def get_retriever():
+    # Cached so the BM25 index is only rebuilt when the document index changes
+    def load_retriever(k, rerank):
+        reranker = None
+        if rerank:
+            reranker = registry.get("cross-encoder", load_cross_encoder, config={"model_name": CROSS_ENCODER_MODEL})
+        return HybridRetriever(index_manager=get_index_manager(), k=k, reranker=reranker)
+    return registry.get("hybrid-retriever", load_retriever, config={"k": RETRIEVER_K, "rerank": USE_RERANKER},
+                        size_mb=0)
+
+def get_answer_cache():
+    # Shared by all sessions: FAQ-style questions repeat across users
+    return registry.get(
+        "answer-cache",
+        lambda threshold, ttl: SemanticAnswerCache(get_embeddings(), threshold=threshold, ttl=ttl),
+        config={"threshold": float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.92)),
+                "ttl": float(os.getenv("ANSWER_CACHE_TTL", 3600))},
+        size_mb=0,
+    )
+
+def get_history_store():
+    # Token-bounded histories shared by the process; the SQLite backend keeps
+    # them across restarts
+    return registry.get(
+        "history-store",
+        create_history_store,
+        config={
+            "backend": os.getenv("HISTORY_BACKEND", "sqlite"),
+            "db_path": os.getenv("HISTORY_DB", "chat_history.db"),
+            "max_tokens": int(os.getenv("HISTORY_MAX_TOKENS", 1500)),
+            "summary_max_tokens": int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", 300)),
+        },
+        size_mb=0,
+    )
+
+def get_interaction_logger():
+    return registry.get("interaction-logger", InteractionLogger, config={"log_dir": "logs"}, size_mb=0)
+
+def get_question_rewriter():
+    return registry.get("question-rewriter", QuestionRewriter, size_mb=0)
+
+# Start loading the embedder while the user is still typing the API key
+registry.warmup_async("hf-embeddings", load_embeddings, config={"model_name": EMBEDDING_MODEL},
+                      warmup=warmup_embeddings)
 
 # Streamlit UI
 st.title("Conversational RAG With Chat History")
 
+SESSION_ID_RE = re.compile(r"session_[0-9a-f]{32}")
+
 # Input the Groq API Key
 api_key = st.text_input("Enter your Groq API key:", type="password")
 
 # Check if Groq API key is provided
 if api_key:
-    llm = ChatGroq(groq_api_key=api_key, model_name="Gemma2-9b-It")
+    llm = get_llm(api_key)
 
     # Chat interface
-    session_id = st.text_input("Session ID", value="default_session")
+    # Histories are shared by the whole process, so the key is a random 128-bit id
+    # generated here. It is kept in the page URL (?session=...), so a reload or a
+    # bookmark resumes the conversation, also after a restart with the SQLite
+    # store. Ids of any other form are replaced, so a readable name such as
+    # another user's "session_<name>" can never be picked
+    new_conversation = st.button("New conversation")
+    session_id = st.query_params.get("session", "")
+    if new_conversation or not SESSION_ID_RE.fullmatch(session_id):
+        session_id = f"session_{uuid.uuid4().hex}"
+        st.query_params["session"] = session_id
 
     # Statefully manage chat history
-    if 'store' not in st.session_state:
-        st.session_state.store = {}
+    history_store = get_history_store()
+    history_store.evict_idle()
 
-    # Load and split documents from the "docs" directory
-    def load_and_split_documents():
-        docs = []
-        for file in os.listdir("docs"):
-            if file.endswith(".txt"):
-                loader = TextLoader(os.path.join("docs", file))
-                docs.extend(loader.load())
-
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=50)
-        splits = text_splitter.split_documents(docs)
-        return splits
-
-    splits = load_and_split_documents()
-    vectorstore = FAISS.from_documents(documents=splits, embedding=embeddings)
-    retriever = vectorstore.as_retriever()
+    # Load the persisted FAISS index once per process and re-embed only the
+    # documents in "docs" that were added, changed or deleted since the last run
+    index_manager = get_index_manager()
+    index_manager.sync()
+    # Hybrid BM25 + dense retrieval, optionally re-ranked by a cross-encoder
+    retriever = get_retriever()
 
     # Prompt templates
     contextualize_q_system_prompt = (
@@ -76,7 +174,11 @@ if api_key:
         ]
     )
 
-    history_aware_retriever = create_history_aware_retriever(llm, retriever, contextualize_q_prompt)
+    # Rewrites a follow-up into a standalone question. The rewriter skips the
+    # LLM call on first turns and for questions that do not refer back to the
+    # history
+    contextualize_q_chain = contextualize_q_prompt | llm | StrOutputParser()
+    question_rewriter = get_question_rewriter()
 
     system_prompt = (
         "You are an assistant for question-answering tasks. "
@@ -94,13 +196,15 @@ if api_key:
     )
 
     question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+    # Retrieval runs on the standalone question computed before the chain is called,
+    # so the same question can be used as the semantic cache key
+    rag_chain = RunnablePassthrough.assign(
+        context=(lambda inputs: inputs["standalone_question"]) | retriever
+    ).assign(answer=question_answer_chain)
 
     # Chat history management
-    def get_session_history(session: str) -> ChatMessageHistory:
-        if session not in st.session_state.store:
-            st.session_state.store[session] = ChatMessageHistory()
-        return st.session_state.store[session]
+    def get_session_history(session: str) -> BaseChatMessageHistory:
+        return history_store.get(session)
 
     conversational_rag_chain = RunnableWithMessageHistory(
         rag_chain,
@@ -110,44 +214,98 @@ if api_key:
         output_messages_key="answer"
     )
 
-    def log_interaction_to_csv(user_id, session_id, user_input, answer, chat_history):
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        os.makedirs("logs", exist_ok=True)
-        log_file_path = os.path.join("logs", f"{session_id}_chat_log.csv")
-
-        history_text = ""
-        for msg in chat_history.messages:
-            role = "User" if msg.type == "human" else "Bot"
-            history_text += f"{role}: {msg.content} | "
+    # Input from user
+    stream_mode = st.checkbox("Stream the answer", value=True)
+    # chat_input returns the question only on the rerun that submits it. Reruns
+    # from other widgets (the checkbox, "New conversation") therefore show the
+    # history without asking the last question again
+    user_input = st.chat_input("Your question:")
 
-        with open(log_file_path, mode="a", newline='', encoding="utf-8") as file:
-            writer = csv.writer(file)
-            if file.tell() == 0:
-                writer.writerow(["Timestamp", "User ID", "Session ID", "User Input", "Answer", "History"])
-            writer.writerow([timestamp, user_id, session_id, user_input, answer, history_text.strip()])
+    session_history = get_session_history(session_id)
+    chain_config = {"configurable": {"session_id": session_id}}
 
-    # Input from user
-    user_input = st.text_input("Your question:")
+    # Display chat history
+    if user_input or session_history.messages:
+        st.subheader("Chat History:")
+    if session_history.summary:
+        with st.expander("Earlier conversation (summarized)"):
+            st.text(session_history.summary)
+    for msg in session_history.recent_messages:
+        if msg.type == "human":
+            st.markdown(f"**You:** {msg.content}")
+        else:
+            st.markdown(f"**Bot:** {msg.content}")
 
-    if user_input and session_id:
-        session_history = get_session_history(session_id)
+    if user_input:
+        st.markdown(f"**You:** {user_input}")
 
-        response = conversational_rag_chain.invoke(
-            {"input": user_input},
-            config={"configurable": {"session_id": session_id}},
+        metrics = StreamMetrics()
+        standalone_question, rewrite_reason = question_rewriter.rewrite(
+            contextualize_q_chain, user_input, session_history.messages
+        )
+        answer_cache = get_answer_cache()
+        cached_answer, similarity, question_vector = answer_cache.lookup(
+            standalone_question, index_manager.version
         )
+        chain_inputs = {"input": user_input, "standalone_question": standalone_question}
 
-        # Log interaction to CSV
-        log_interaction_to_csv(user_id, session_id, user_input, response["answer"], session_history)
+        if cached_answer is not None:
+            # Cache hit: no LLM call, just record the turn in the history
+            session_history.add_messages([HumanMessage(content=user_input), AIMessage(content=cached_answer)])
+            response = {"answer": cached_answer}
+            metrics.record_token()
+            metrics.finish()
+            st.markdown(f"**Bot:** {cached_answer}")
+            st.caption(f"Answered from cache (similarity {similarity:.2f})")
+        elif stream_mode:
+            # Render tokens as they arrive instead of waiting for the full answer
+            response = {}
+            answer_placeholder = st.empty()
+            answer_text = ""
+            for token in stream_answer(conversational_rag_chain, chain_inputs, chain_config,
+                                       metrics, response):
+                answer_text += token
+                answer_placeholder.markdown(f"**Bot:** {answer_text}▌")
+            answer_placeholder.markdown(f"**Bot:** {response['answer']}")
+        else:
+            response = conversational_rag_chain.invoke(chain_inputs, config=chain_config)
+            metrics.record_token()
+            metrics.finish()
+            st.markdown(f"**Bot:** {response['answer']}")
 
+        if cached_answer is None and response["answer"]:
+            answer_cache.store(standalone_question, response["answer"], index_manager.version,
+                               vector=question_vector)
 
-        # Display chat history
-        st.subheader("Chat History:")
-        for msg in session_history.messages:
-            if msg.type == "human":
-                st.markdown(f"**You:** {msg.content}")
-            else:
-                st.markdown(f"**Bot:** {msg.content}")
+        # Keep per-request latency metrics for this session
+        st.session_state.setdefault("request_metrics", []).append(metrics.to_dict())
+        if metrics.tokens_per_sec:
+            st.caption(f"First token after {metrics.time_to_first_token:.2f}s, "
+                       f"{metrics.tokens_per_sec:.1f} tokens/s, {metrics.total_time:.2f}s total")
+        else:
+            st.caption(f"Answered in {metrics.total_time:.2f}s")
+
+        rewrite_stats = question_rewriter.stats()
+        st.sidebar.subheader("Question rewrite")
+        st.sidebar.write(f"{rewrite_stats['skipped_fraction']:.0%} of {rewrite_stats['turns']} turns "
+                         f"skipped the rewrite call (this turn: {rewrite_reason})")
+        if rewrite_stats["estimated_seconds_saved"] is not None:
+            st.sidebar.write(f"~{rewrite_stats['estimated_seconds_saved']:.1f}s saved "
+                             f"at {rewrite_stats['avg_rewrite_seconds']:.2f}s per call")
+
+        # Queue one compact record for this turn; a background thread writes it
+        get_interaction_logger().log({
+            "user_id": user_id,
+            "session_id": session_id,
+            "turn": session_history.turn_count,
+            "user_input": user_input,
+            "standalone_question": standalone_question,
+            "answer": response["answer"],
+            "rewrite": rewrite_reason,
+            "cache_hit": cached_answer is not None,
+            "streamed": stream_mode and cached_answer is None,
+            **metrics.to_dict(),
+        })
 
 else:
     st.warning("Please enter the Groq API Key")
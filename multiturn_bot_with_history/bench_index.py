@@ -0,0 +1,86 @@
+"""
+FAISS index benchmark: build time, memory, query latency and recall@k of each
+index type against the exact flat baseline.
+
+    python bench_index.py --n 100000 --dim 384 --k 10 --types flat ivf_flat ivf_pq hnsw
+
+The corpus is synthetic (clustered gaussian vectors of the embedding model's
+dimension), so it scales to sizes the docs/ folder does not reach. Recall@k is
+the fraction of the flat index's top k that each index also returns.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from faiss_indexes import INDEX_TYPES, build_index, index_size_bytes, read_index
+
+
+def make_corpus(n, dim, n_queries, n_clusters=256, seed=0):
+    # Embeddings cluster by topic, which is what IVF partitioning relies on
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, n + n_queries)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((n + n_queries, dim)).astype(np.float32)
+    return vectors[:n], vectors[n:]
+
+
+def timed_search(index, queries, k):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids[0])
+    return np.array(results), statistics.median(latencies)
+
+
+def recall_at_k(results, truth):
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index types against a flat index.")
+    parser.add_argument("--n", type=int, default=100000, help="number of corpus vectors")
+    parser.add_argument("--dim", type=int, default=384, help="vector dimension (all-MiniLM-L6-v2 is 384)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--pq-m", type=int, default=48)
+    parser.add_argument("--ef-search", type=int, default=64)
+    args = parser.parse_args()
+
+    corpus, queries = make_corpus(args.n, args.dim, args.queries)
+    params = {"nprobe": args.nprobe, "pq_m": args.pq_m, "ef_search": args.ef_search}
+    index_dir = tempfile.mkdtemp()
+
+    truth = None
+    print(f"{'index':<10} {'build s':>8} {'size MB':>8} {'load ms':>8} {'mmap ms':>8} {'p50 ms':>7} {'R@' + str(args.k):>6}")
+    for index_type in ["flat"] + [t for t in args.types if t != "flat"]:
+        start = time.perf_counter()
+        index = build_index(index_type, args.dim, corpus, **params)
+        index.add(corpus)
+        build_s = time.perf_counter() - start
+        size_mb = index_size_bytes(index) / (1024 * 1024)
+
+        path = os.path.join(index_dir, f"{index_type}.faiss")
+        faiss.write_index(index, path)
+        start = time.perf_counter()
+        read_index(path)
+        load_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        read_index(path, mmap=True)
+        mmap_ms = (time.perf_counter() - start) * 1000
+
+        results, p50 = timed_search(index, queries, args.k)
+        if truth is None:
+            truth = results
+        if index_type in args.types:
+            print(f"{index_type:<10} {build_s:>8.2f} {size_mb:>8.1f} {load_ms:>8.1f} {mmap_ms:>8.1f} "
+                  f"{p50:>7.3f} {recall_at_k(results, truth):>6.3f}")
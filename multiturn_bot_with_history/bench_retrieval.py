@@ -0,0 +1,90 @@
+"""
+Retrieval benchmark on the docs/ corpus: recall@k and query latency for
+dense-only, BM25-only, hybrid (RRF) and hybrid + cross-encoder retrieval,
+across chunking configurations.
+
+    python bench_retrieval.py --k 1 3 5 --chunking 100:50 400:80 800:100 [--rerank]
+
+A query counts as recalled at k when any of the top k chunks contains the
+expected answer text.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from langchain_huggingface import HuggingFaceEmbeddings
+from hybrid_retriever import HybridRetriever, load_cross_encoder
+from index_manager import load_index
+
+# (question, text that a relevant chunk must contain)
+QUERIES = [
+    ("Do I get my money back if my visa is rejected?", "non-refundable"),
+    ("Which kinds of visas can you help me with?", "tourist, business, student"),
+    ("How long will my application take?", "processing times vary"),
+    ("What paperwork do I have to submit?", "valid passport"),
+    ("Is approval guaranteed?", "cannot guarantee"),
+    ("How do I get in touch with support?", "live chat"),
+    ("Can I follow the status of my application?", "real-time updates"),
+    ("Is someone available to help at night?", "around the clock"),
+    ("What is the company's mission?", "simplify the visa process"),
+    ("Will you help me organize my documents?", "organizing all necessary documents"),
+    ("Do you give individual guidance to each client?", "personalized support"),
+    ("Can you handle trips for study or leisure?", "business, study, or leisure"),
+]
+
+
+def evaluate(search, ks):
+    hits = {k: 0 for k in ks}
+    latencies = []
+    for question, expected in QUERIES:
+        start = time.perf_counter()
+        docs = search(question, max(ks))
+        latencies.append((time.perf_counter() - start) * 1000)
+        for k in ks:
+            if any(expected.lower() in doc.page_content.lower() for doc in docs[:k]):
+                hits[k] += 1
+    recall = {k: hits[k] / len(QUERIES) for k in ks}
+    return recall, statistics.median(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval recall and latency on docs/.")
+    parser.add_argument("--docs-dir", default="docs")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--chunking", nargs="+", default=["100:50", "400:80", "800:100"],
+                        help="chunk_size:chunk_overlap pairs to compare")
+    parser.add_argument("--rerank", action="store_true", help="also benchmark cross-encoder re-ranking")
+    args = parser.parse_args()
+
+    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    reranker = load_cross_encoder() if args.rerank else None
+
+    header = "  ".join(f"R@{k:<3}" for k in args.k)
+    print(f"{'chunking':<10} {'chunks':>6}  {'retriever':<18} {header}  p50 ms")
+    for chunking in args.chunking:
+        chunk_size, chunk_overlap = (int(v) for v in chunking.split(":"))
+        manager = load_index(embeddings, docs_dir=args.docs_dir, index_dir=tempfile.mkdtemp(),
+                             chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        docstore = manager.vectorstore.docstore
+        hybrid = HybridRetriever(index_manager=manager, k=max(args.k))
+
+        def by_ids(ids, k):
+            return [docstore.search(doc_id) for doc_id in ids[:k]]
+
+        retrievers = {
+            "dense": lambda q, k: manager.vectorstore.similarity_search(q, k=k),
+            "bm25": lambda q, k: by_ids(hybrid.sparse_search(q, k), k),
+            "hybrid (rrf)": lambda q, k: hybrid.invoke(q),
+        }
+        if reranker is not None:
+            reranked = HybridRetriever(index_manager=manager, k=max(args.k), reranker=reranker)
+            retrievers["hybrid + rerank"] = lambda q, k: reranked.invoke(q)
+            reranked.sparse_search("warmup", 1)
+
+        # Build the BM25 index outside the timed queries
+        hybrid.sparse_search("warmup", 1)
+        for name, search in retrievers.items():
+            recall, p50 = evaluate(search, args.k)
+            scores = "  ".join(f"{recall[k]:<5.2f}" for k in args.k)
+            print(f"{chunking:<10} {len(docstore._dict):>6}  {name:<18} {scores}  {p50:.1f}")
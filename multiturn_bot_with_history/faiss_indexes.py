@@ -0,0 +1,136 @@
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": None,       # IVF cells; None picks about 4 * sqrt(n)
+    "nprobe": 16,        # IVF cells visited per query
+    "pq_m": 48,          # PQ sub-quantizers, must divide the embedding dimension
+    "pq_nbits": 8,       # bits per PQ code
+    "hnsw_m": 32,        # HNSW graph degree
+    "ef_construction": 200,
+    "ef_search": 64,
+    "train_size": 50000,  # vectors sampled for IVF training
+}
+
+
+def min_training_vectors(index_type, params):
+    """Vectors needed to train an index of this type; 0 when no training is needed."""
+    if index_type == "ivf_flat":
+        return 39
+    if index_type == "ivf_pq":
+        return max(39, 2 ** params["pq_nbits"])
+    return 0
+
+
+def choose_nlist(n_vectors, params):
+    if params.get("nlist"):
+        return params["nlist"]
+    # Rule of thumb from the faiss wiki, capped so every cell gets ~39 training points
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def build_index(index_type, dim, sample_vectors=None, **params):
+    """
+    Creates an empty faiss index of the given type, trained on sample_vectors
+    when the type needs training. Falls back to an exact flat index when there
+    are too few vectors to train on, which is the right choice for small corpora.
+    """
+    params = {**DEFAULT_INDEX_PARAMS, **params}
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
+    n_sample = 0 if sample_vectors is None else len(sample_vectors)
+    if n_sample < min_training_vectors(index_type, params):
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+        return index
+
+    sample = np.ascontiguousarray(sample_vectors, dtype=np.float32)
+    if len(sample) > params["train_size"]:
+        rng = np.random.default_rng(0)
+        sample = sample[rng.choice(len(sample), params["train_size"], replace=False)]
+    nlist = choose_nlist(len(sample), params)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], params["pq_nbits"])
+    index.train(sample)
+    # Keep the quantizer alive with the index (the python wrapper does not own it)
+    index.own_fields = True
+    quantizer.this.disown()
+    index.nprobe = params["nprobe"]
+    return index
+
+
+def index_type_of(index):
+    """Inverse of build_index: the type name of an existing faiss index."""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def set_search_params(index, **params):
+    params = {**DEFAULT_INDEX_PARAMS, **params}
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = params["nprobe"]
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = params["ef_search"]
+
+
+def reconstruct_vectors(index, positions=None):
+    """
+    Returns the stored vectors at positions (all of them by default). For
+    IVF-PQ these are the quantized approximations of the original vectors.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        # IVF indexes need an id -> list map before vectors can be looked up
+        index.make_direct_map()
+    if positions is None:
+        return index.reconstruct_n(0, index.ntotal)
+    if len(positions) == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    return np.vstack([index.reconstruct(int(i)) for i in positions])
+
+
+def compact_index(index, keep_positions):
+    """
+    Returns a copy of index holding only the vectors at keep_positions, in order.
+
+    Flat indexes compact on remove_ids, but IVF labels are not renumbered and
+    HNSW cannot remove at all, so the surviving vectors are reconstructed and
+    re-added to an emptied clone that keeps the trained quantizers.
+    """
+    vectors = reconstruct_vectors(index, keep_positions)
+    new_index = faiss.clone_index(index)
+    if isinstance(new_index, faiss.IndexIVF):
+        new_index.set_direct_map_type(faiss.DirectMap.NoMap)
+    new_index.reset()
+    new_index.add(vectors)
+    return new_index
+
+
+def read_index(path, mmap=False):
+    """Reads a saved index; with mmap the index data is paged in from disk on demand."""
+    if mmap:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(path)
+
+
+def index_size_bytes(index):
+    """Serialized size of an index, a close proxy for its resident memory."""
+    return faiss.serialize_index(index).size
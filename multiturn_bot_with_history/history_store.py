@@ -0,0 +1,211 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def count_tokens(text):
+    """Rough token count (about four characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def summarize_turns(summary, messages, max_tokens):
+    """
+    Folds messages into the running summary without an LLM call: each message
+    is reduced to its first sentence, and the oldest summary lines are dropped
+    once the summary exceeds max_tokens.
+    """
+    lines = summary.splitlines() if summary else []
+    for msg in messages:
+        role = "User" if msg.type == "human" else "Bot"
+        first_sentence = SENTENCE_END_RE.split(msg.content.strip(), maxsplit=1)[0]
+        lines.append(f"{role}: {' '.join(first_sentence.split()[:30])}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class BoundedChatHistory(BaseChatMessageHistory):
+    """
+    Chat history capped by a token budget.
+
+    Once the stored turns exceed max_tokens the oldest ones are rolled into a
+    running summary, which is exposed as a leading system message, so the
+    prompt sent to the LLM stays roughly constant in size however long the
+    conversation runs. Every change is written through to the owning store.
+    """
+
+    def __init__(self, session_id, store, max_tokens=1500, summary_max_tokens=300,
+                 summarize=summarize_turns, messages=None, summary="", turn_count=0):
+        self.session_id = session_id
+        self.store = store
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.summarize = summarize
+        self.recent_messages = list(messages or [])
+        self.summary = summary
+        # Total user turns ever, unlike len(messages) which stays flat once trimmed
+        self.turn_count = turn_count
+
+    @property
+    def messages(self):
+        if self.summary:
+            return [SystemMessage(content=f"Summary of the earlier conversation:\n{self.summary}")] + self.recent_messages
+        return list(self.recent_messages)
+
+    def add_messages(self, messages):
+        for msg in messages:
+            self.recent_messages.append(msg)
+            if msg.type == "human":
+                self.turn_count += 1
+        self._trim()
+        self.store.save(self)
+
+    def _trim(self):
+        tokens = sum(count_tokens(msg.content) for msg in self.recent_messages)
+        rolled = []
+        # Always keep the latest exchange verbatim
+        while tokens > self.max_tokens and len(self.recent_messages) > 2:
+            msg = self.recent_messages.pop(0)
+            tokens -= count_tokens(msg.content)
+            rolled.append(msg)
+        if rolled:
+            self.summary = self.summarize(self.summary, rolled, self.summary_max_tokens)
+
+    def clear(self):
+        self.recent_messages = []
+        self.summary = ""
+        self.turn_count = 0
+        self.store.save(self)
+
+
+class InMemoryHistoryStore:
+    """Process-wide LRU of session histories; idle and least recently used sessions are evicted."""
+
+    def __init__(self, max_sessions=1000, idle_ttl=24 * 3600, **history_kwargs):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_kwargs = history_kwargs
+        self._sessions = OrderedDict()  # session_id -> (history, last_active)
+        self._lock = threading.Lock()
+
+    def _load(self, session_id):
+        return BoundedChatHistory(session_id, self, **self.history_kwargs)
+
+    def get(self, session_id):
+        with self._lock:
+            if session_id in self._sessions:
+                history, _ = self._sessions.pop(session_id)
+                self._sessions[session_id] = (history, time.time())
+                return history
+
+        history = self._load(session_id)
+        with self._lock:
+            # Another session may have loaded it meanwhile; keep the first copy
+            history = self._sessions.pop(session_id, (history, None))[0]
+            self._sessions[session_id] = (history, time.time())
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return history
+
+    def save(self, history):
+        with self._lock:
+            if history.session_id in self._sessions:
+                self._sessions[history.session_id] = (history, time.time())
+                self._sessions.move_to_end(history.session_id)
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            idle = [sid for sid, (_, last_active) in self._sessions.items() if last_active < cutoff]
+            for session_id in idle:
+                del self._sessions[session_id]
+        return idle
+
+
+class SQLiteHistoryStore(InMemoryHistoryStore):
+    """
+    Session histories persisted in SQLite so they survive restarts, with the
+    in-memory LRU in front. Only the bounded window and summary are stored,
+    so each save rewrites a constant amount of data.
+    """
+
+    def __init__(self, db_path="chat_history.db", max_sessions=1000, idle_ttl=7 * 24 * 3600, **history_kwargs):
+        super().__init__(max_sessions=max_sessions, idle_ttl=idle_ttl, **history_kwargs)
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                turn_count INTEGER NOT NULL DEFAULT 0,
+                last_active REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (session_id, position)
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions (last_active);
+        """)
+
+    def _load(self, session_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT summary, turn_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY position", (session_id,)
+            ).fetchall()
+        messages = [HumanMessage(content=content) if role == "human" else AIMessage(content=content)
+                    for role, content in rows]
+        summary, turn_count = row if row else ("", 0)
+        return BoundedChatHistory(session_id, self, messages=messages, summary=summary,
+                                  turn_count=turn_count, **self.history_kwargs)
+
+    def save(self, history):
+        super().save(history)
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO sessions (session_id, summary, turn_count, last_active) VALUES (?, ?, ?, ?)
+                   ON CONFLICT(session_id) DO UPDATE SET
+                       summary = excluded.summary, turn_count = excluded.turn_count,
+                       last_active = excluded.last_active""",
+                (history.session_id, history.summary, history.turn_count, time.time()),
+            )
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (history.session_id,))
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, position, role, content) VALUES (?, ?, ?, ?)",
+                [(history.session_id, i, msg.type, msg.content) for i, msg in enumerate(history.recent_messages)],
+            )
+
+    def evict_idle(self):
+        """Drops sessions idle for longer than idle_ttl from memory and disk."""
+        super().evict_idle()
+        cutoff = time.time() - self.idle_ttl
+        with self._db_lock, self._conn:
+            idle = [row[0] for row in self._conn.execute(
+                "SELECT session_id FROM sessions WHERE last_active < ?", (cutoff,)
+            )]
+            self._conn.executemany("DELETE FROM messages WHERE session_id = ?", [(sid,) for sid in idle])
+            self._conn.execute("DELETE FROM sessions WHERE last_active < ?", (cutoff,))
+        return idle
+
+
+def create_history_store(backend="sqlite", **kwargs):
+    if backend == "memory":
+        kwargs.pop("db_path", None)
+        return InMemoryHistoryStore(**kwargs)
+    if backend == "sqlite":
+        return SQLiteHistoryStore(**kwargs)
+    raise ValueError(f"Unknown history backend: {backend}")
@@ -0,0 +1,114 @@
+import re
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+from rank_bm25 import BM25Okapi
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "my", "of", "on", "or", "our", "the", "to", "we", "what", "with", "you", "your",
+}
+
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def normalize_token(token):
+    # Crude plural folding so "refund" matches "refunds"; no stemmer dependency
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [normalize_token(token) for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=60):
+    """
+    Fuses ranked lists of doc ids: score(d) = sum over lists of 1 / (rrf_k + rank).
+    Returns doc ids ordered by fused score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Sparse BM25 + dense FAISS retrieval fused with reciprocal-rank fusion.
+
+    Both retrievers return fetch_k candidates; RRF merges them by rank, so
+    their incomparable scores never need calibrating. An optional cross-encoder
+    re-scores the fused candidates before the top k are returned. The BM25
+    index is built from the FAISS docstore and rebuilt whenever the index
+    version changes.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index_manager: Any
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    reranker: Optional[Any] = None
+    rerank_top_n: int = 20
+
+    _bm25: Any = PrivateAttr(default=None)
+    _bm25_ids: List[str] = PrivateAttr(default_factory=list)
+    _bm25_version: Optional[str] = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _ensure_bm25(self):
+        with self._lock:
+            if self._bm25 is not None and self._bm25_version == self.index_manager.version:
+                return
+            docstore = self.index_manager.vectorstore.docstore._dict
+            self._bm25_ids = list(docstore)
+            corpus = [tokenize(docstore[doc_id].page_content) for doc_id in self._bm25_ids]
+            self._bm25 = BM25Okapi(corpus) if corpus else None
+            self._bm25_version = self.index_manager.version
+
+    def sparse_search(self, query, k):
+        self._ensure_bm25()
+        tokens = tokenize(query)
+        if self._bm25 is None or not tokens:
+            return []
+        scores = self._bm25.get_scores(tokens)
+        top = np.argsort(scores)[::-1][:k]
+        return [self._bm25_ids[i] for i in top if scores[i] > 0]
+
+    def dense_search(self, query, k):
+        docs = self.index_manager.vectorstore.similarity_search(query, k=k)
+        return [doc.id for doc in docs if doc.id is not None]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        fused = reciprocal_rank_fusion(
+            [self.dense_search(query, self.fetch_k), self.sparse_search(query, self.fetch_k)],
+            rrf_k=self.rrf_k,
+        )
+        docstore = self.index_manager.vectorstore.docstore
+        candidates = [docstore.search(doc_id) for doc_id in fused]
+        candidates = [doc for doc in candidates if isinstance(doc, Document)]
+
+        if self.reranker is not None and candidates:
+            candidates = candidates[:self.rerank_top_n]
+            scores = self.reranker.predict([(query, doc.page_content) for doc in candidates])
+            order = np.argsort(scores)[::-1]
+            candidates = [candidates[i] for i in order]
+        return candidates[:self.k]
+
+
+def load_cross_encoder(model_name=CROSS_ENCODER_MODEL):
+    # Imported lazily: re-ranking is optional and sentence-transformers is heavy
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name)
@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.document_loaders import TextLoader
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from faiss_indexes import (
+    DEFAULT_INDEX_PARAMS, build_index, compact_index, index_type_of, min_training_vectors,
+    read_index, reconstruct_vectors, set_search_params,
+)
+
+MANIFEST_NAME = "manifest.json"
+INDEX_CONFIG_NAME = "index_config.json"
+# An IVF index is retrained once it holds this many times the vectors it was trained on
+RETRAIN_GROWTH = 4
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Returns the hex sha256 digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def walk_documents(root, extensions=(".txt",)):
+    """Yields the paths of documents under root, recursively and in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(tuple(extensions)):
+                yield os.path.join(dirpath, name)
+
+
+def chunk_ids(source, sha256, count):
+    # Stable per source and content, so re-adding an unchanged file is a no-op
+    return [f"{source}:{sha256[:12]}:{i}" for i in range(count)]
+
+
+def is_under(path, root):
+    root = os.path.abspath(root)
+    return os.path.commonpath([os.path.abspath(path), root]) == root
+
+
+class IndexManager:
+    """
+    Keeps a FAISS index on disk in sync with the .txt files of a docs directory.
+
+    A manifest next to the index records, per source file, its size, mtime,
+    content hash and the ids of the chunks it produced. On sync only files that
+    were added, changed or deleted are (re-)embedded or removed by id, so an
+    unchanged corpus costs a handful of os.stat calls.
+
+    index_type selects the faiss index (see faiss_indexes.INDEX_TYPES). IVF
+    types are trained on the vectors available when the index is first built
+    and retrained as the corpus grows; until there are enough vectors to train
+    on, an exact flat index is used. When index_type is None the saved index
+    keeps its type and params; asking for a different type than the saved one
+    raises ValueError unless convert=True, which rebuilds it. With mmap=True the saved index is memory
+    mapped instead of read into RAM, and only loaded fully when a sync has to
+    modify it.
+    """
+
+    def __init__(self, embeddings, docs_dir="docs", index_dir="faiss_index",
+                 chunk_size=100, chunk_overlap=50, index_type=None, index_params=None, mmap=False,
+                 convert=False):
+        self.embeddings = embeddings
+        self.docs_dir = docs_dir
+        self.index_dir = index_dir
+        self.chunking = [chunk_size, chunk_overlap]
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        # None means: whatever the saved index uses (flat for a new index)
+        self.index_type = index_type or "flat"
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+        self._explicit_type = index_type is not None
+        self._explicit_params = index_params is not None
+        self.convert = convert
+        self.mmap = mmap
+        self.vectorstore = None
+        self.manifest = {}
+        # Type, params and training size of the saved index
+        self.index_config = {}
+        self._mmapped = False
+        self.version = None
+        # Streamlit sessions share one manager, so syncs must not interleave
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.index_dir, MANIFEST_NAME)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.index_dir, "index.faiss")
+
+    @property
+    def docstore_path(self):
+        return os.path.join(self.index_dir, "index.pkl")
+
+    def load(self):
+        """Loads the saved index and manifest from disk, if present."""
+        if os.path.exists(self.index_path):
+            index = read_index(self.index_path, mmap=self.mmap)
+            set_search_params(index, **self.index_params)
+            # The index is produced by this app only, so unpickling the docstore is safe
+            with open(self.docstore_path, "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            self.vectorstore = FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+            self._mmapped = self.mmap
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        elif self.vectorstore is not None:
+            # Index saved before manifests existed: adopt its chunks per source so
+            # they get replaced (not duplicated) on the first sync
+            for doc_id, doc in self.vectorstore.docstore._dict.items():
+                source = doc.metadata.get("source")
+                entry = self.manifest.setdefault(source, {"sha256": None, "size": None, "mtime": None, "ids": []})
+                entry["ids"].append(doc_id)
+        config_path = os.path.join(self.index_dir, INDEX_CONFIG_NAME)
+        if os.path.exists(config_path):
+            with open(config_path, encoding="utf-8") as f:
+                self.index_config = json.load(f)
+        self._resolve_index_type()
+        self._update_version()
+        return self
+
+    def _resolve_index_type(self):
+        # Indexes saved before index_config.json existed are always flat
+        saved_type = self.index_config.get("index_type", "flat") if self.vectorstore is not None else None
+        if saved_type is None:
+            return
+        if not self._explicit_type:
+            self.index_type = saved_type
+        elif saved_type != self.index_type and not self.convert:
+            raise ValueError(
+                f"The index in {self.index_dir} is {saved_type!r} but {self.index_type!r} was requested. "
+                f"Unset INDEX_TYPE to use the saved index, or pass convert=True "
+                f"(ingest.py --convert) to rebuild it as {self.index_type!r}."
+            )
+        if not self._explicit_params and self.index_config.get("params"):
+            self.index_params = {**DEFAULT_INDEX_PARAMS, **self.index_config["params"]}
+
+    def _update_version(self):
+        # Changes whenever any document is added, changed or removed, so caches
+        # derived from the index can tell when they are stale
+        digest = hashlib.sha256()
+        for source in sorted(self.manifest):
+            entry = self.manifest[source]
+            digest.update(f"{source}:{entry['sha256']}:{entry.get('chunking')}\n".encode("utf-8"))
+        self.version = digest.hexdigest()[:16]
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        if self.vectorstore is not None:
+            # Written to a temp file and renamed, so a memory-mapped copy of the
+            # old index stays valid and a crash never leaves a truncated index
+            faiss.write_index(self.vectorstore.index, self.index_path + ".tmp")
+            os.replace(self.index_path + ".tmp", self.index_path)
+            with open(self.docstore_path + ".tmp", "wb") as f:
+                pickle.dump((self.vectorstore.docstore, self.vectorstore.index_to_docstore_id), f)
+            os.replace(self.docstore_path + ".tmp", self.docstore_path)
+        with open(os.path.join(self.index_dir, INDEX_CONFIG_NAME), "w", encoding="utf-8") as f:
+            json.dump(self.index_config, f, indent=2)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+
+    def _make_writable(self):
+        # A memory-mapped index is read-only; load it into RAM before modifying it
+        if self._mmapped:
+            self.vectorstore.index = read_index(self.index_path)
+            set_search_params(self.vectorstore.index, **self.index_params)
+            self._mmapped = False
+
+    def add_documents(self, splits, ids):
+        """Embeds splits and adds them under ids, building and training the index on first use."""
+        if not splits:
+            return
+        texts = [doc.page_content for doc in splits]
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        if self.vectorstore is None:
+            index = build_index(self.index_type, vectors.shape[1], vectors, **self.index_params)
+            self.vectorstore = FAISS(self.embeddings, index, InMemoryDocstore(), {})
+            self.index_config = {"index_type": self.index_type, "params": self.index_params,
+                                 "trained_on": len(vectors)}
+        self._make_writable()
+        self.vectorstore.add_embeddings(
+            zip(texts, vectors.tolist()), metadatas=[doc.metadata for doc in splits], ids=ids
+        )
+
+    def delete_documents(self, ids):
+        """Removes chunks by id, compacting index types that cannot remove in place."""
+        self._make_writable()
+        if index_type_of(self.vectorstore.index) == "flat":
+            self.vectorstore.delete(ids=ids)
+            return
+        drop = set(ids)
+        keep = [(position, doc_id) for position, doc_id in sorted(self.vectorstore.index_to_docstore_id.items())
+                if doc_id not in drop]
+        self.vectorstore.index = compact_index(self.vectorstore.index, [position for position, _ in keep])
+        self.vectorstore.index_to_docstore_id = {i: doc_id for i, (_, doc_id) in enumerate(keep)}
+        self.vectorstore.docstore.delete([doc_id for doc_id in ids if doc_id in self.vectorstore.docstore._dict])
+
+    def _needs_rebuild(self):
+        index = self.vectorstore.index
+        actual = index_type_of(index)
+        if actual != self.index_type:
+            # The flat fallback is kept while the corpus is too small to train on
+            return not (actual == "flat" and index.ntotal < min_training_vectors(self.index_type, self.index_params))
+        if self.index_config.get("params") != self.index_params:
+            return True
+        trained_on = self.index_config.get("trained_on") or index.ntotal
+        return isinstance(index, faiss.IndexIVF) and index.ntotal > RETRAIN_GROWTH * trained_on
+
+    def rebuild(self):
+        """
+        Rebuilds the index with the configured type, retraining on all vectors.
+        Positions are preserved, so the docstore mapping is unchanged. Vectors
+        are reconstructed from the index, except from IVF-PQ, whose codes are
+        lossy: retraining on them would compound the error with every rebuild,
+        so those chunks are re-embedded from the docstore texts.
+        """
+        self._make_writable()
+        index = self.vectorstore.index
+        if index_type_of(index) == "ivf_pq":
+            docs = self.vectorstore.docstore._dict
+            ids = self.vectorstore.index_to_docstore_id
+            texts = [docs[ids[position]].page_content for position in range(index.ntotal)]
+            vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        else:
+            vectors = reconstruct_vectors(index)
+        new_index = build_index(self.index_type, index.d, vectors, **self.index_params)
+        new_index.add(vectors)
+        self.vectorstore.index = new_index
+        self.index_config = {"index_type": self.index_type, "params": self.index_params,
+                             "trained_on": len(vectors)}
+
+    def _scan(self):
+        """Returns {source: os.stat_result} for every .txt file under the docs directory."""
+        return {path: os.stat(path) for path in walk_documents(self.docs_dir)}
+
+    def _split_file(self, source, sha256):
+        docs = TextLoader(source, encoding="utf-8").load()
+        splits = self.text_splitter.split_documents(docs)
+        return splits, chunk_ids(source, sha256, len(splits))
+
+    def is_current(self, source, stat):
+        """True when source was indexed with this chunking and its size and mtime are unchanged."""
+        entry = self.manifest.get(source)
+        return (entry is not None and entry.get("chunking") == self.chunking
+                and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime)
+
+    def record_source(self, source, stat, sha256, ids):
+        self.manifest[source] = {
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "chunking": self.chunking,
+            "ids": ids,
+        }
+
+    def maybe_rebuild(self):
+        """Rebuilds the index if its type, params or training size no longer fit; returns True if it did."""
+        if self.vectorstore is None or not self._needs_rebuild():
+            return False
+        self.rebuild()
+        return True
+
+    def checkpoint(self):
+        """Refreshes the version and saves; lets long ingestions persist progress between batches."""
+        self._update_version()
+        self.save()
+
+    def sync(self):
+        """
+        Brings the index up to date with the docs directory.
+        Returns a dict with the added, changed and removed source paths.
+        """
+        with self._lock:
+            return self._sync()
+
+    def _sync(self):
+        current = self._scan()
+        added, changed, removed = [], [], []
+
+        for source in list(self.manifest):
+            # Documents ingested from other trees (see ingest.py) are not ours to remove
+            if source not in current and is_under(source, self.docs_dir):
+                removed.append(source)
+
+        to_embed = []
+        for source, stat in current.items():
+            if self.is_current(source, stat):
+                continue
+            entry = self.manifest.get(source)
+            # A different chunking config means the file must be re-split
+            same_chunking = entry is not None and entry.get("chunking") == self.chunking
+            sha256 = file_sha256(source)
+            if same_chunking and entry["sha256"] == sha256:
+                # Touched but not modified: only refresh the cheap fingerprint
+                entry["mtime"] = stat.st_mtime
+                continue
+            (changed if entry else added).append(source)
+            to_embed.append((source, stat, sha256))
+
+        stale_ids = []
+        for source in removed + changed:
+            stale_ids.extend(self.manifest[source]["ids"])
+        for source in removed:
+            del self.manifest[source]
+        if stale_ids and self.vectorstore is not None:
+            self.delete_documents(stale_ids)
+
+        # Split everything first so a new IVF index is trained on the whole batch
+        new_splits, new_ids = [], []
+        for source, stat, sha256 in to_embed:
+            splits, ids = self._split_file(source, sha256)
+            new_splits.extend(splits)
+            new_ids.extend(ids)
+            self.record_source(source, stat, sha256, ids)
+        self.add_documents(new_splits, new_ids)
+
+        rebuilt = self.maybe_rebuild()
+
+        if added or changed or removed:
+            self._update_version()
+        if added or changed or removed or rebuilt or not os.path.exists(self.manifest_path):
+            self.save()
+        return {"added": added, "changed": changed, "removed": removed}
+
+
+def load_index(embeddings, docs_dir="docs", index_dir="faiss_index", **kwargs):
+    """Loads the persistent index, syncs it with docs_dir and returns the manager."""
+    manager = IndexManager(embeddings, docs_dir=docs_dir, index_dir=index_dir, **kwargs).load()
+    manager.sync()
+    return manager
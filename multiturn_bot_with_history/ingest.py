@@ -0,0 +1,213 @@
+"""
+Streaming ingestion of a document tree into the persistent FAISS index.
+
+    python ingest.py /data/corpus --index-dir faiss_index --workers 8 --batch-size 256
+
+Files are read, hashed and split in a process pool while the main process
+embeds finished chunks in fixed-size batches and appends them to the index.
+Only a bounded number of files are in flight and at most one batch (plus the
+tail of the file that filled it) is buffered, so memory stays flat however
+large the corpus is. Files whose size, mtime or content hash match the
+manifest are skipped, so an interrupted run resumes where it stopped.
+"""
+import argparse
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from faiss_indexes import INDEX_TYPES, min_training_vectors
+from index_manager import IndexManager, chunk_ids, walk_documents
+
+_splitters = {}
+
+
+def load_and_split(source, chunk_size, chunk_overlap, known_sha256=None):
+    """
+    Runs in a worker process: hashes and splits one file.
+    Returns (source, stat, sha256, texts); texts is None when the content is unchanged.
+    """
+    stat = os.stat(source)
+    with open(source, "rb") as f:
+        data = f.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+    if sha256 == known_sha256:
+        return source, stat, sha256, None
+    # One splitter per worker process and chunking config
+    splitter = _splitters.get((chunk_size, chunk_overlap))
+    if splitter is None:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        _splitters[(chunk_size, chunk_overlap)] = splitter
+    texts = splitter.split_text(data.decode("utf-8", errors="replace"))
+    return source, stat, sha256, texts
+
+
+class Ingestor:
+    """Buffers split chunks and appends them to the index in fixed-size batches."""
+
+    def __init__(self, manager, batch_size=256, first_batch_size=None, checkpoint_every=20):
+        self.manager = manager
+        self.batch_size = batch_size
+        # A new IVF index is trained on its first batch, so that one may need to be larger
+        self.first_batch_size = first_batch_size or batch_size
+        self.checkpoint_every = checkpoint_every
+        self.buffer = []
+        # Ids to remove before the next batch is added; deleting per flush instead
+        # of per file matters because IVF/HNSW deletes rebuild the whole index
+        self.stale_ids = []
+        # source -> [stat, sha256, ids, chunks not yet added]
+        self.pending = {}
+        self.batches = 0
+        self.files_done = 0
+        self.chunks_done = 0
+        self.bytes_done = 0
+        self.start = time.perf_counter()
+        self._last_report = 0.0
+
+    def add_file(self, source, stat, sha256, texts):
+        entry = self.manager.manifest.get(source)
+        if texts is None:
+            # Touched but not modified: only refresh the cheap fingerprint
+            entry["mtime"] = stat.st_mtime
+            self._file_done(stat)
+            return
+        ids = chunk_ids(source, sha256, len(texts))
+        stale_ids = list(entry["ids"]) if entry is not None else []
+        if self.manager.vectorstore is not None:
+            # Chunks added by an interrupted run before the file reached the manifest
+            docstore = self.manager.vectorstore.docstore._dict
+            stale_ids += [doc_id for doc_id in ids if doc_id in docstore and doc_id not in stale_ids]
+        self.stale_ids.extend(stale_ids)
+        self.manager.manifest.pop(source, None)
+        self.pending[source] = [stat, sha256, ids, len(texts)]
+        for text, doc_id in zip(texts, ids):
+            self.buffer.append((Document(page_content=text, metadata={"source": source}), doc_id))
+        if not texts:
+            self._finish_source(source)
+        while len(self.buffer) >= self._next_batch_size():
+            self.flush(self._next_batch_size())
+
+    def _next_batch_size(self):
+        return self.first_batch_size if self.manager.vectorstore is None else self.batch_size
+
+    def delete_stale(self):
+        if self.stale_ids:
+            self.manager.delete_documents(self.stale_ids)
+            self.stale_ids = []
+
+    def flush(self, size=None):
+        # Before adding, since a re-ingested chunk can reuse the id of a stale one
+        self.delete_stale()
+        batch, self.buffer = self.buffer[:size], self.buffer[len(self.buffer) if size is None else size:]
+        if not batch:
+            return
+        self.manager.add_documents([doc for doc, _ in batch], [doc_id for _, doc_id in batch])
+        self.chunks_done += len(batch)
+        for doc, _ in batch:
+            source = doc.metadata["source"]
+            self.pending[source][3] -= 1
+            if self.pending[source][3] == 0:
+                self._finish_source(source)
+        self.batches += 1
+        if self.batches % self.checkpoint_every == 0:
+            self.manager.checkpoint()
+
+    def _finish_source(self, source):
+        # A file enters the manifest only once all of its chunks are in the index
+        stat, sha256, ids, _ = self.pending.pop(source)
+        self.manager.record_source(source, stat, sha256, ids)
+        self._file_done(stat)
+
+    def _file_done(self, stat):
+        self.files_done += 1
+        self.bytes_done += stat.st_size
+
+    def report(self, total_files=None, end="\r"):
+        now = time.perf_counter()
+        if end == "\r" and now - self._last_report < 1.0:
+            return
+        self._last_report = now
+        elapsed = now - self.start
+        files = f"{self.files_done}/{total_files}" if total_files else str(self.files_done)
+        print(
+            f"files {files}  chunks {self.chunks_done}  "
+            f"{self.chunks_done / elapsed:.0f} chunks/s  "
+            f"{self.bytes_done / elapsed / (1024 * 1024):.2f} MB/s  {elapsed:.0f}s",
+            end=end, flush=True,
+        )
+
+
+def ingest(manager, root, extensions=(".txt",), workers=None, batch_size=256, max_in_flight=None,
+           checkpoint_every=20, train_sample=10000):
+    """Ingests every document under root into manager's index; returns the Ingestor with its counters."""
+    first_batch_size = batch_size
+    if manager.vectorstore is None and min_training_vectors(manager.index_type, manager.index_params):
+        # Buffer a larger first batch so a new IVF index is trained on a representative sample
+        first_batch_size = max(batch_size, train_sample)
+    ingestor = Ingestor(manager, batch_size=batch_size, first_batch_size=first_batch_size,
+                        checkpoint_every=checkpoint_every)
+    chunk_size, chunk_overlap = manager.chunking
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 4 * workers
+
+    sources = []
+    for source in walk_documents(root, extensions):
+        if not manager.is_current(source, os.stat(source)):
+            sources.append(source)
+    print(f"{len(sources)} new or modified files under {root}")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        remaining = iter(sources)
+        while True:
+            # Keep at most max_in_flight files loaded, so memory does not grow with the corpus
+            for source in remaining:
+                entry = manager.manifest.get(source)
+                known = entry["sha256"] if entry and entry.get("chunking") == manager.chunking else None
+                in_flight.add(pool.submit(load_and_split, source, chunk_size, chunk_overlap, known))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                ingestor.add_file(*future.result())
+            ingestor.report(len(sources))
+
+    ingestor.flush()
+    manager.maybe_rebuild()
+    manager.checkpoint()
+    ingestor.report(len(sources), end="\n")
+    return ingestor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a document tree into the persistent FAISS index.")
+    parser.add_argument("root", help="directory to walk for documents")
+    parser.add_argument("--index-dir", default="faiss_index")
+    parser.add_argument("--ext", nargs="+", default=[".txt"], help="file extensions to ingest")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv("CHUNK_SIZE", 400)))
+    parser.add_argument("--chunk-overlap", type=int, default=int(os.getenv("CHUNK_OVERLAP", 80)))
+    parser.add_argument("--index-type", default=os.getenv("INDEX_TYPE"), choices=INDEX_TYPES,
+                        help="index type for a new index (default: the saved index's type, or flat)")
+    parser.add_argument("--convert", action="store_true",
+                        help="rebuild an existing index whose type differs from --index-type")
+    parser.add_argument("--workers", type=int, default=None, help="loader processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks embedded per batch")
+    parser.add_argument("--train-sample", type=int, default=10000,
+                        help="chunks buffered to train a new IVF index on")
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="save the index every N batches")
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(model_name=args.embedding_model)
+    manager = IndexManager(embeddings, docs_dir=args.root, index_dir=args.index_dir,
+                           chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+                           index_type=args.index_type, convert=args.convert).load()
+    ingest(manager, args.root, extensions=tuple(args.ext), workers=args.workers,
+           batch_size=args.batch_size, checkpoint_every=args.checkpoint_every, train_sample=args.train_sample)
@@ -0,0 +1,135 @@
+import argparse
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Anything but these is replaced in file names, so a session id cannot escape log_dir
+UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def log_path(log_dir, session_id):
+    """File holding a session's records; the id is reduced to a safe file name."""
+    name = UNSAFE_FILENAME_RE.sub("_", str(session_id))[:128] or "unknown"
+    return os.path.join(log_dir, f"{name}.jsonl")
+
+
+class InteractionLogger:
+    """
+    Buffered, append-only JSONL log of chat turns.
+
+    log() only puts the record on a queue, so the request path never touches
+    the disk. A background thread drains the queue and appends one compact
+    line per turn to logs/{session_id}.jsonl every flush_interval seconds (or
+    sooner once max_batch records are waiting). Each record holds just that
+    turn, so logging cost no longer grows with the length of the conversation.
+    """
+
+    def __init__(self, log_dir="logs", flush_interval=1.0, max_batch=500):
+        self.log_dir = log_dir
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, record):
+        record.setdefault("timestamp", datetime.datetime.now().isoformat(timespec="milliseconds"))
+        self._queue.put(record)
+
+    def _drain(self, first=None):
+        batch = [] if first is None else [first]
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        by_session = defaultdict(list)
+        for record in batch:
+            by_session[record.get("session_id", "unknown")].append(record)
+        os.makedirs(self.log_dir, exist_ok=True)
+        for session_id, records in by_session.items():
+            lines = []
+            for record in records:
+                # A record that cannot be serialized is skipped, not the whole batch
+                try:
+                    lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+                except (TypeError, ValueError):
+                    logger.exception("Skipping an interaction record of session %s", session_id)
+            if lines:
+                with open(log_path(self.log_dir, session_id), "a", encoding="utf-8") as f:
+                    f.write("".join(lines))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Let more records accumulate so each flush is one write per session
+            self._stop.wait(self.flush_interval)
+            self._write_safely(self._drain(first))
+        self._write_safely(self._drain())
+
+    def _write_safely(self, batch):
+        # A failed write (full disk, bad record) loses this batch, not the writer thread
+        try:
+            self._write(batch)
+        except Exception:
+            logger.exception("Could not write %d interaction records to %s", len(batch), self.log_dir)
+
+    def close(self):
+        """Stops the writer thread after flushing everything still queued."""
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+
+
+def read_records(log_dir="logs", session_id=None):
+    """Yields logged turn records, for one session or for every session."""
+    if session_id is not None:
+        paths = [log_path(log_dir, session_id)]
+    else:
+        paths = sorted(os.path.join(log_dir, name) for name in os.listdir(log_dir) if name.endswith(".jsonl"))
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                # Distinct ids can share a sanitized file name
+                if session_id is None or record.get("session_id", "unknown") == session_id:
+                    yield record
+
+
+def reconstruct_session(log_dir, session_id):
+    """Rebuilds a session's conversation as (role, text) pairs ordered by turn."""
+    records = sorted(read_records(log_dir, session_id), key=lambda r: (r.get("turn", 0), r["timestamp"]))
+    conversation = []
+    for record in records:
+        conversation.append(("User", record["user_input"]))
+        conversation.append(("Bot", record["answer"]))
+    return conversation
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a logged chat session.")
+    parser.add_argument("session_id")
+    parser.add_argument("--log-dir", default="logs")
+    args = parser.parse_args()
+    for role, text in reconstruct_session(args.log_dir, args.session_id):
+        print(f"{role}: {text}")
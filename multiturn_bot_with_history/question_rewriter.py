@@ -0,0 +1,87 @@
+import re
+import threading
+import time
+
+# Words that usually point back at something said earlier in the conversation
+ANAPHORA = {
+    "it", "its", "it's", "itself", "they", "them", "their", "theirs", "themselves",
+    "this", "that", "these", "those", "he", "him", "his", "she", "her", "hers",
+    "there", "one", "ones", "former", "latter", "same", "above", "previous",
+    "earlier", "else", "more", "another", "other", "others",
+}
+# Openings of elliptical follow-ups ("and for students?", "what about pricing?")
+FOLLOW_UP_PREFIXES = (
+    "and ", "but ", "also ", "so ", "then ", "or ", "what about", "how about",
+    "what else", "why not", "same for", "is that", "are those",
+)
+MIN_SELF_CONTAINED_WORDS = 3
+
+WORD_RE = re.compile(r"[a-z']+")
+
+
+def needs_rewrite(question):
+    """
+    Cheap local check for whether a question depends on the chat history.
+    Follow-ups are usually short, open with a connective, or use a pronoun
+    that refers back to an earlier turn; anything else is sent to retrieval
+    as it is.
+    """
+    text = question.strip().lower()
+    words = WORD_RE.findall(text)
+    if len(words) < MIN_SELF_CONTAINED_WORDS:
+        return True
+    if text.startswith(FOLLOW_UP_PREFIXES):
+        return True
+    return any(word in ANAPHORA for word in words)
+
+
+class QuestionRewriter:
+    """
+    Decides per turn whether the history-aware rewrite LLM call is needed.
+
+    First turns and self-contained questions skip the call. Rewrites are not
+    cached: every rerun of the app records a new exchange, so no earlier
+    rewrite was made against the same history. Counts and timings are kept to
+    report how many turns avoided the call and roughly how much latency that
+    saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"first_turn": 0, "self_contained": 0, "llm": 0}
+        self.llm_seconds = 0.0
+
+    def rewrite(self, rewrite_chain, user_input, chat_history):
+        """Returns (standalone_question, reason), reason being a key of counts."""
+        if not chat_history:
+            return user_input, self._count("first_turn")
+        if not needs_rewrite(user_input):
+            return user_input, self._count("self_contained")
+
+        start = time.perf_counter()
+        question = rewrite_chain.invoke({"input": user_input, "chat_history": chat_history})
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.counts["llm"] += 1
+            self.llm_seconds += elapsed
+        return question, "llm"
+
+    def _count(self, reason):
+        with self._lock:
+            self.counts[reason] += 1
+        return reason
+
+    def stats(self):
+        with self._lock:
+            turns = sum(self.counts.values())
+            skipped = turns - self.counts["llm"]
+            average_call = self.llm_seconds / self.counts["llm"] if self.counts["llm"] else None
+            return {
+                **self.counts,
+                "turns": turns,
+                "skipped_fraction": skipped / turns if turns else 0.0,
+                "avg_rewrite_seconds": average_call,
+                # Skipped turns times the measured cost of a rewrite call
+                "estimated_seconds_saved": skipped * average_call if average_call else None,
+            }
@@ -0,0 +1,71 @@
+import time
+
+
+class StreamMetrics:
+    """Timing of one streamed answer: time to first token and generation rate."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.end = None
+        self.token_count = 0
+
+    def record_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.token_count += 1
+
+    def finish(self):
+        self.end = time.perf_counter()
+
+    @property
+    def time_to_first_token(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.start
+
+    @property
+    def total_time(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    @property
+    def tokens_per_sec(self):
+        if self.first_token_at is None or self.token_count < 2:
+            return None
+        generation_time = (self.end or time.perf_counter()) - self.first_token_at
+        return (self.token_count - 1) / generation_time if generation_time > 0 else None
+
+    def to_dict(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "total_time": self.total_time,
+            "tokens": self.token_count,
+            "tokens_per_sec": self.tokens_per_sec,
+        }
+
+
+def stream_answer(chain, inputs, config, metrics, result=None):
+    """
+    Streams a retrieval chain and yields answer text chunks as the LLM produces them.
+
+    The chain emits partial dicts (input, chat_history, context, then one
+    "answer" piece per LLM chunk); everything other than the answer is
+    collected into result. Groq streams roughly one token per chunk, so
+    metrics counts non-empty answer chunks as tokens.
+    """
+    if result is None:
+        result = {}
+    answer_parts = []
+    try:
+        for chunk in chain.stream(inputs, config=config):
+            for key, value in chunk.items():
+                if key == "answer":
+                    if value:
+                        metrics.record_token()
+                        answer_parts.append(value)
+                        yield value
+                else:
+                    result[key] = value
+    finally:
+        metrics.finish()
+        result["answer"] = "".join(answer_parts)
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import index_manager
+from index_manager import INDEX_CONFIG_NAME, IndexManager
+from ingest import ingest
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    embedded: list = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def make_manager(tmp_path, **kwargs):
+    return IndexManager(CountingEmbedding(size=16, embedded=[]), docs_dir=str(tmp_path / "docs"),
+                        index_dir=str(tmp_path / "index"), chunk_size=40, chunk_overlap=0, **kwargs)
+
+
+def write_doc(tmp_path, name, text):
+    path = tmp_path / "docs" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_index_without_index_config_json_survives_an_edit(tmp_path):
+    source = write_doc(tmp_path, "a.txt", "first paragraph of text\n\nsecond paragraph of text")
+    write_doc(tmp_path, "b.txt", "another document entirely")
+    make_manager(tmp_path).load().sync()
+    # Indexes saved before index types were configurable have a manifest but no index_config.json
+    os.remove(tmp_path / "index" / INDEX_CONFIG_NAME)
+
+    manager = make_manager(tmp_path).load()
+    ids = manager.manifest[source]["ids"]
+    assert len(ids) == len(set(ids))
+
+    os.utime(source, (1, 1))
+    write_doc(tmp_path, "a.txt", "edited paragraph of text")
+    assert manager.sync()["changed"] == [source]
+    assert len(manager.vectorstore.docstore._dict) == manager.vectorstore.index.ntotal == 2
+
+    reloaded = make_manager(tmp_path).load()
+    assert reloaded.sync() == {"added": [], "changed": [], "removed": []}
+
+
+def test_ivf_pq_rebuild_reembeds_instead_of_decoding(tmp_path):
+    for i in range(60):
+        write_doc(tmp_path, f"{i:02d}.txt", f"document number {i} about topic {i % 7}")
+    manager = make_manager(tmp_path, index_type="ivf_pq", index_params={"pq_m": 4, "pq_nbits": 4, "nlist": 2})
+    manager.load().sync()
+    manager.embeddings.embedded.clear()
+
+    manager.rebuild()
+    assert len(manager.embeddings.embedded) == manager.vectorstore.index.ntotal == 60
+
+
+def test_saved_index_type_is_kept_unless_requested(tmp_path):
+    write_doc(tmp_path, "a.txt", "some text")
+    make_manager(tmp_path, index_type="hnsw").load().sync()
+
+    manager = make_manager(tmp_path).load()
+    assert manager.index_type == "hnsw"
+    manager.sync()
+    assert type(manager.vectorstore.index).__name__ == "IndexHNSWFlat"
+
+    with pytest.raises(ValueError, match="hnsw"):
+        make_manager(tmp_path, index_type="flat").load()
+    converted = make_manager(tmp_path, index_type="flat", convert=True).load()
+    converted.sync()
+    assert type(converted.vectorstore.index).__name__ == "IndexFlatL2"
+
+
+def test_ingest_compacts_once_for_many_modified_files(tmp_path, monkeypatch):
+    root = tmp_path / "docs"
+    for i in range(20):
+        write_doc(tmp_path, f"{i:02d}.txt", f"document {i}")
+    manager = make_manager(tmp_path, index_type="hnsw").load()
+    ingest(manager, str(root), workers=1)
+    for i in range(20):
+        write_doc(tmp_path, f"{i:02d}.txt", f"edited document {i}")
+
+    compactions = []
+    compact_index = index_manager.compact_index
+    monkeypatch.setattr(index_manager, "compact_index", lambda *args: compactions.append(1) or compact_index(*args))
+    ingest(manager, str(root), workers=1)
+    assert len(compactions) == 1
+    assert manager.vectorstore.index.ntotal == len(manager.vectorstore.docstore._dict) == 20
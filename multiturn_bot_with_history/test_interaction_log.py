@@ -0,0 +1,40 @@
+import json
+import os
+import time
+
+from interaction_log import InteractionLogger, read_records
+
+
+def test_writer_survives_a_failed_write(tmp_path):
+    log_dir = tmp_path / "logs"
+    log_dir.write_text("not a directory")
+    log = InteractionLogger(log_dir=str(log_dir), flush_interval=0.01)
+    log.log({"session_id": "a", "answer": "lost"})
+    time.sleep(0.2)
+    assert log._thread.is_alive()
+
+    log_dir.unlink()
+    log.log({"session_id": "a", "answer": "later"})
+    log.close()
+    assert [r["answer"] for r in read_records(str(log_dir), "a")] == ["later"]
+
+
+def test_unserializable_record_only_loses_itself(tmp_path):
+    log = InteractionLogger(log_dir=str(tmp_path), flush_interval=0.01)
+    log._write([{"session_id": "a", "answer": "first"}, {"session_id": "a", "answer": object()},
+                {"session_id": "a", "answer": "third"}, {"session_id": "b", "answer": "other user"}])
+    log.close()
+    assert [r["answer"] for r in read_records(str(tmp_path), "a")] == ["first", "third"]
+    assert [r["answer"] for r in read_records(str(tmp_path), "b")] == ["other user"]
+
+
+def test_session_id_cannot_escape_the_log_dir(tmp_path):
+    log_dir = tmp_path / "logs"
+    log = InteractionLogger(log_dir=str(log_dir), flush_interval=0.01)
+    log.log({"session_id": "../../escaped", "answer": "x"})
+    log.close()
+    assert os.listdir(tmp_path) == ["logs"]
+    [name] = os.listdir(log_dir)
+    with open(log_dir / name) as f:
+        assert json.loads(f.readline())["session_id"] == "../../escaped"
+    assert [r["answer"] for r in read_records(str(log_dir), "../../escaped")] == ["x"]
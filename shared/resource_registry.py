@@ -0,0 +1,168 @@
+"""
+Process-wide model registry shared by the Streamlit apps in this repository
+(multiturn_bot_with_history, text-to-image-generation). Each app adds this
+directory to sys.path before importing it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(name, config=None):
+    """
+    Builds a registry key from a model name and its config.
+    The config is hashed so secrets such as API keys never appear in the key.
+    """
+    config_json = json.dumps(config or {}, sort_keys=True, default=str)
+    return f"{name}:{hashlib.sha256(config_json.encode()).hexdigest()[:16]}"
+
+
+def estimate_size_mb(resource):
+    """Best-effort memory estimate: parameter bytes for torch modules, else 0."""
+    modules = [resource]
+    # Wrappers such as HuggingFaceEmbeddings or tuples of (processor, model)
+    if isinstance(resource, (tuple, list)):
+        modules = list(resource)
+    for attr in ("client", "model", "_client"):
+        inner = getattr(resource, attr, None)
+        if inner is not None:
+            modules.append(inner)
+
+    total = 0
+    seen = set()
+    for module in modules:
+        parameters = getattr(module, "parameters", None)
+        if not callable(parameters):
+            continue
+        try:
+            for p in parameters():
+                if id(p) not in seen:
+                    seen.add(id(p))
+                    total += p.numel() * p.element_size()
+        except TypeError:
+            continue
+    return total / (1024 * 1024)
+
+
+class _Entry:
+    def __init__(self, value, size_mb):
+        self.value = value
+        self.size_mb = size_mb
+        self.last_used = time.time()
+
+
+class ResourceRegistry:
+    """
+    Process-wide cache of expensive resources (models, API clients, indexes).
+
+    Streamlit re-executes the app script on every rerun and for every session,
+    but imported modules live for the whole process, so a registry held at
+    module level is shared by all users. Entries are loaded lazily on first
+    use, optionally warmed up, and evicted least-recently-used first once the
+    estimated memory of all entries exceeds the budget.
+    """
+
+    def __init__(self, memory_budget_mb=None):
+        self.memory_budget_mb = memory_budget_mb
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key so two sessions never load the same model twice
+        self._key_locks = {}
+        self._warmups = {}
+
+    def get(self, name, loader, config=None, warmup=None, size_mb=None, max_entries=None):
+        """
+        Returns the resource for (name, config), calling loader(**config) on a miss.
+        warmup, if given, is called with the fresh resource before it is shared.
+        max_entries caps how many configs of this name are kept (e.g. one API
+        client per key); the least recently used are dropped first.
+        """
+        key = make_key(name, config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.last_used = time.time()
+                return entry.value
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return entry.value
+
+            value = loader(**(config or {}))
+            if warmup is not None:
+                warmup(value)
+            if size_mb is None:
+                size_mb = estimate_size_mb(value)
+
+            with self._lock:
+                self._entries[key] = _Entry(value, size_mb)
+                if max_entries is not None:
+                    self._evict_over_count(name, max_entries, keep=key)
+                self._evict_over_budget(keep=key)
+            return value
+
+    def warmup_async(self, name, loader, config=None, warmup=None, size_mb=None):
+        """
+        Loads a resource on a background thread so the first request finds it ready.
+        Streamlit calls this on every rerun, so only the first call per key starts
+        a thread; later calls return that thread.
+        """
+        key = make_key(name, config)
+        with self._lock:
+            thread = self._warmups.get(key)
+            if thread is None:
+                thread = threading.Thread(
+                    target=self.get, args=(name, loader, config, warmup, size_mb), daemon=True
+                )
+                self._warmups[key] = thread
+                thread.start()
+        return thread
+
+    def evict(self, name=None, config=None):
+        """Drops one entry, every entry of a name (config=None), or everything (name=None)."""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                return
+            if config is not None:
+                self._entries.pop(make_key(name, config), None)
+                return
+            for key in [k for k in self._entries if k.startswith(f"{name}:")]:
+                del self._entries[key]
+
+    def _evict_over_count(self, name, max_entries, keep):
+        keys = [k for k in self._entries if k.startswith(f"{name}:") and k != keep]
+        # _entries is in least recently used order, and keep is the newest
+        for key in keys[:max(0, len(keys) + 1 - max_entries)]:
+            del self._entries[key]
+            self._key_locks.pop(key, None)
+
+    def _evict_over_budget(self, keep):
+        if self.memory_budget_mb is None:
+            return
+        total = sum(entry.size_mb for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.memory_budget_mb:
+                break
+            # Dropping zero-sized entries (clients, indexes) would free nothing
+            if key == keep or self._entries[key].size_mb == 0:
+                continue
+            total -= self._entries.pop(key).size_mb
+
+    def stats(self):
+        with self._lock:
+            return {
+                key: {"size_mb": round(entry.size_mb, 1), "last_used": entry.last_used}
+                for key, entry in self._entries.items()
+            }
+
+
+_budget = os.getenv("MODEL_MEMORY_BUDGET_MB")
+registry = ResourceRegistry(memory_budget_mb=float(_budget) if _budget else None)
@@ -0,0 +1,42 @@
+import threading
+
+from resource_registry import ResourceRegistry
+
+
+def test_budget_eviction_skips_zero_sized_entries():
+    registry = ResourceRegistry(memory_budget_mb=100)
+    registry.get("client", lambda: "client", size_mb=0)
+    registry.get("small", lambda: "small", size_mb=40)
+    registry.get("large", lambda: "large", size_mb=80)
+    # Dropping the client frees nothing, so the least recently used model goes instead
+    assert {key.split(":")[0] for key in registry.stats()} == {"client", "large"}
+
+
+def test_warmup_async_starts_one_thread_per_key():
+    registry = ResourceRegistry()
+    release = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        release.wait(5)
+        return "model"
+
+    first = registry.warmup_async("model", loader)
+    assert registry.warmup_async("model", loader) is first
+    release.set()
+    first.join()
+    assert registry.warmup_async("model", loader) is first
+    assert loads == [1]
+
+
+def test_max_entries_keeps_the_most_recently_used_configs():
+    registry = ResourceRegistry()
+    for key in ("a", "b", "c"):
+        registry.get("llm", lambda api_key: api_key, config={"api_key": key}, size_mb=0, max_entries=2)
+    registry.get("llm", lambda api_key: api_key, config={"api_key": "b"}, max_entries=2)
+    registry.get("llm", lambda api_key: api_key, config={"api_key": "d"}, size_mb=0, max_entries=2)
+    assert len(registry.stats()) == 2
+    loads = []
+    registry.get("llm", lambda api_key: loads.append(api_key) or api_key, config={"api_key": "b"}, max_entries=2)
+    assert loads == []
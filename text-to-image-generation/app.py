@@ -1,15 +1,26 @@
-import streamlit as st
-from database import init_db, insert_prompt, fetch_images, connect_db
-from generator import generate_image
-from evaluation import evaluate_image
 import os
+import sys
+import streamlit as st
+from database import init_db, fetch_images_page, search_prompts, get_pool, update_scores
+from generator import generate_image_cached
+from job_queue import GenerationQueue
+# resource_registry.py is shared by the apps in this repository and lives in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from resource_registry import registry
+from thumbnails import get_thumbnail
+from evaluation import evaluate_images, warmup_models
 import pandas as pd
 
 # Initialize the database
 init_db()
 
-# Connect to the database
-connection = connect_db()
+# Load the evaluation models in the background (no-op once they are cached)
+warmup_models()
+
+# Connections are borrowed from the process-wide pool around each database call.
+# The with blocks return them even when the script stops early (st.stop, a rerun
+# or an exception)
+db_pool = get_pool()
 
 # Streamlit page setup
 st.set_page_config(page_title="Stable Diffusion Generator", layout="centered")
@@ -39,20 +50,27 @@ style = st.selectbox("Choose a style", styles)
 evaluation_reports = []  # List to store evaluation reports
 
 if st.button("Generate Image"):
-    image_path = generate_image(prompt, style)
+    # Repeat requests are served from the cache without calling the API;
+    # new images are inserted into the database by the cache
+    with db_pool.connection() as connection:
+        image_path, row_id, cache_hit = generate_image_cached(connection, prompt, style)
     
     if image_path:  
-        # Insert prompt and image path into the database
-        insert_prompt(connection, prompt, style, image_path)
+        if cache_hit:
+            st.caption("Served from cache")
 
-        # Evaluate the generated image against the prompt
-        evaluation_result = evaluate_image(image_path, prompt)
+        # Evaluate the generated image against the prompt and keep the score
+        result = evaluate_images([(image_path, prompt)], batch_size=1)[0]
+        evaluation_result = result["evaluation"]
+        with db_pool.connection() as connection:
+            update_scores(connection, [(result["score"], result["caption"], evaluation_result, row_id)])
 
         # Store the evaluation report
         evaluation_reports.append({
             "Prompt": prompt,
             "Image Path": image_path,
-            "Evaluation": evaluation_result
+            "Evaluation": evaluation_result,
+            "Score": result["score"]
         })
 
         # Display the evaluation result
@@ -60,27 +78,90 @@ if st.button("Generate Image"):
         st.image(image_path, use_container_width=True)
         st.write(f"**Prompt:** {prompt}")
         st.write(f"**Evaluation:** {evaluation_result}")
+        if result["score"] is not None:
+            st.write(f"**Similarity score:** {result['score']:.3f} (caption: {result['caption']})")
 
     else:
         st.write("Image generation failed.")
 
-# Display the image gallery
+# Batch generation: jobs run concurrently and each image is shown as it lands
+st.subheader("Batch Generation")
+batch_prompts = st.text_area("Enter one prompt per line")
+batch_styles = st.multiselect("Styles for the batch", styles, default=[style])
+
+if st.button("Generate Batch"):
+    jobs = [
+        (line.strip(), batch_style)
+        for line in batch_prompts.splitlines() if line.strip()
+        for batch_style in batch_styles
+    ]
+    # One queue (and HTTP connection pool) is shared by every session
+    queue = registry.get("generation-queue", GenerationQueue, config={"max_workers": 4}, size_mb=0)
+    progress = st.progress(0.0)
+    batch_gallery = st.container()
+    with db_pool.connection() as connection:
+        for done, result in enumerate(queue.run(jobs, conn=connection), start=1):
+            progress.progress(done / len(jobs))
+            with batch_gallery:
+                if result["error"]:
+                    st.warning(f"Failed for prompt: {result['prompt']} ({result['error']})")
+                    continue
+                col1, col2 = st.columns([1, 2])
+                with col1:
+                    st.image(get_thumbnail(result["image_path"]) or result["image_path"], use_container_width=True)
+                with col2:
+                    st.write(f"**Prompt:** {result['prompt']}")
+                    st.write(f"**Style:** {result['style']}" + (" (cached)" if result["cache_hit"] else ""))
+
+# Display the image gallery, one page at a time
+GALLERY_PAGE_SIZE = 10
 st.subheader("Generated Images")
-images = fetch_images(connection)  
+search_text = st.text_input("Search prompts")
+
+# Keyset pagination: remember the id each visited page started before
+if st.session_state.get("gallery_search") != search_text:
+    st.session_state.gallery_search = search_text
+    st.session_state.gallery_cursors = [None]
+cursors = st.session_state.setdefault("gallery_cursors", [None])
+
+with db_pool.connection() as connection:
+    if search_text.strip():
+        images = search_prompts(connection, search_text, before_id=cursors[-1], limit=GALLERY_PAGE_SIZE + 1)
+    else:
+        images = fetch_images_page(connection, before_id=cursors[-1], limit=GALLERY_PAGE_SIZE + 1)
+# One extra row tells us whether a next page exists
+has_next = len(images) > GALLERY_PAGE_SIZE
+images = images[:GALLERY_PAGE_SIZE]
+
 if images:
-    for entry in images:
-        prompt, image_path = entry
-        if os.path.exists(image_path):
-            col1, col2 = st.columns([1, 2])  # Create two columns
-            with col1:
-                st.image(image_path, use_container_width=True)  # Display the image
-            with col2:
-                st.write(f"**Prompt:** {prompt}")  # Display the prompt below the image
-        else:
-            st.warning(f"Image not found for prompt: {prompt}")
+    for row_id, entry_prompt, image_path, score in images:
+        # Only the current page's thumbnails are read (and created if missing)
+        thumbnail = get_thumbnail(image_path)
+        col1, col2 = st.columns([1, 2])  # Create two columns
+        with col1:
+            if thumbnail:
+                st.image(thumbnail, use_container_width=True)  # Display the thumbnail
+            else:
+                # Evicted from the image cache; the row itself is kept
+                st.info("Image no longer cached. Generate this prompt again to restore it.")
+        with col2:
+            st.write(f"**Prompt:** {entry_prompt}")  # Display the prompt below the image
+            if score is not None:
+                st.write(f"**Score:** {score:.3f}")
 else:
     st.info("No images generated yet.")
 
+prev_col, page_col, next_col = st.columns([1, 2, 1])
+with prev_col:
+    # Callbacks run before the next rerun, so no st.rerun() (which would skip
+    # returning the connection to the pool) is needed
+    st.button("Previous", disabled=len(cursors) == 1, on_click=cursors.pop)
+with page_col:
+    st.caption(f"Page {len(cursors)}")
+with next_col:
+    st.button("Next", disabled=not has_next, on_click=cursors.append,
+              args=(images[-1][0] if images else None,))
+
 # Display evaluation reports
 st.subheader("Evaluation Reports")
 if evaluation_reports:
@@ -103,14 +184,10 @@ if st.button("Download Evaluation Report"):
         mime='text/csv'
     )
 
-# Display prompt history
+# Display prompt history for the current page
 st.subheader("Prompt History")
 if images:
-    for entry in images:
-        prompt, _ = entry
-        st.write(f"- {prompt}")
+    for _, entry_prompt, _, _ in images:
+        st.write(f"- {entry_prompt}")
 else:
     st.info("No prompt history available.")
-
-# Close the database connection
-connection.close()
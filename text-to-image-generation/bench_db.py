@@ -0,0 +1,101 @@
+"""
+Insert and read throughput of the prompts store under concurrent writers.
+
+Compares the original connection handling (a fresh sqlite3.connect() with its
+default 5s busy timeout and the rollback journal) with the pooled WAL
+connections, at the same number of rows per commit for both, so the
+difference comes from the connection and journal setup alone.
+
+    python bench_db.py --writers 4 --rows 2000 --readers 2 --batch-sizes 1 100
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from database import init_db, get_pool, insert_prompts, fetch_images_page
+
+def make_rows(writer, count):
+    return [(f"prompt {writer}-{i} a castle in the clouds", "realistic", f"images/{writer}-{i}.png")
+            for i in range(count)]
+
+def legacy_writer(db_name, writer, rows, batch_size, errors):
+    all_rows = make_rows(writer, rows)
+    for start in range(0, len(all_rows), batch_size):
+        try:
+            # As the original app did: default connection settings, one per operation
+            conn = sqlite3.connect(db_name)
+            conn.execute('PRAGMA journal_mode = DELETE')
+            insert_prompts(conn, all_rows[start:start + batch_size])
+            conn.close()
+        except sqlite3.OperationalError:
+            errors.append(1)
+
+def pooled_writer(db_name, writer, rows, batch_size, errors):
+    pool = get_pool(db_name)
+    all_rows = make_rows(writer, rows)
+    for start in range(0, len(all_rows), batch_size):
+        try:
+            with pool.connection() as conn:
+                insert_prompts(conn, all_rows[start:start + batch_size])
+        except sqlite3.OperationalError:
+            errors.append(1)
+
+def reader(db_name, pooled, stop, counts, errors):
+    pool = get_pool(db_name)
+    while not stop.is_set():
+        try:
+            if pooled:
+                with pool.connection() as conn:
+                    fetch_images_page(conn, limit=20)
+            else:
+                conn = sqlite3.connect(db_name)
+                fetch_images_page(conn, limit=20)
+                conn.close()
+            counts.append(1)
+        except sqlite3.OperationalError:
+            errors.append(1)
+
+def run(label, writer_fn, pooled, writers, rows, readers, batch_size):
+    db_name = os.path.join(tempfile.mkdtemp(), "bench.db")
+    init_db(db_name)
+    if not pooled:
+        conn = sqlite3.connect(db_name)
+        conn.execute('PRAGMA journal_mode = DELETE')
+        conn.close()
+
+    write_errors, read_errors, reads = [], [], []
+    stop = threading.Event()
+    reader_threads = [threading.Thread(target=reader, args=(db_name, pooled, stop, reads, read_errors))
+                      for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer_fn, args=(db_name, w, rows, batch_size, write_errors))
+                      for w in range(writers)]
+
+    start = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in reader_threads:
+        thread.join()
+
+    inserted = writers * rows - len(write_errors) * batch_size
+    print(f"{label:<36} {inserted / elapsed:>10.0f} rows/s  {len(reads) / elapsed:>8.0f} page reads/s  "
+          f"{len(write_errors)} write / {len(read_errors)} read lock errors  ({elapsed:.2f}s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the prompts store under concurrent writers.")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=2000, help="rows per writer")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100], help="rows per commit")
+    args = parser.parse_args()
+
+    for batch_size in args.batch_sizes:
+        run(f"rollback journal, {batch_size} rows/commit", legacy_writer, False,
+            args.writers, args.rows, args.readers, batch_size)
+        run(f"pooled WAL, {batch_size} rows/commit", pooled_writer, True,
+            args.writers, args.rows, args.readers, batch_size)
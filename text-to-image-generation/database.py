@@ -1,12 +1,15 @@
 import sqlite3
 import os
+import queue
+import threading
+from contextlib import contextmanager
 
 # Ensure images directory exists
 os.makedirs("images", exist_ok=True)
 
 # Initialize the database and create the prompts table if it doesn't exist
 def init_db(db_name='prompts.db'):
-    conn = sqlite3.connect(db_name)
+    conn = connect_db(db_name)
     cursor = conn.cursor()
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS prompts (
@@ -16,21 +19,166 @@ def init_db(db_name='prompts.db'):
         image TEXT NOT NULL
     )
     ''')
+    migrate_db(conn)
     conn.commit()
     conn.close()
 
+# Columns added after the original schema, as (name, definition)
+MIGRATION_COLUMNS = [
+    ("score", "REAL"),
+    ("caption", "TEXT"),
+    ("evaluation", "TEXT"),
+    ("cache_key", "TEXT"),
+    ("file_size", "INTEGER"),
+    ("last_used", "REAL"),
+    ("created_at", "TEXT"),
+    ("image_hash", "TEXT"),
+]
+
+MIGRATION_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_prompts_cache_key ON prompts (cache_key)',
+    'CREATE INDEX IF NOT EXISTS idx_prompts_last_used ON prompts (last_used)',
+    'CREATE INDEX IF NOT EXISTS idx_prompts_created_at ON prompts (created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_prompts_image_hash ON prompts (image_hash)',
+    'CREATE INDEX IF NOT EXISTS idx_prompts_score ON prompts (score)',
+    'CREATE INDEX IF NOT EXISTS idx_prompts_style_id ON prompts (expected_style, id)',
+]
+
+# Full-text index over prompts, kept in sync with the prompts table by triggers
+FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts
+       USING fts5(prompt, content='prompts', content_rowid='id')""",
+    """CREATE TRIGGER IF NOT EXISTS prompts_fts_insert AFTER INSERT ON prompts BEGIN
+           INSERT INTO prompts_fts(rowid, prompt) VALUES (new.id, new.prompt);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS prompts_fts_delete AFTER DELETE ON prompts BEGIN
+           INSERT INTO prompts_fts(prompts_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS prompts_fts_update AFTER UPDATE OF prompt ON prompts BEGIN
+           INSERT INTO prompts_fts(prompts_fts, rowid, prompt) VALUES ('delete', old.id, old.prompt);
+           INSERT INTO prompts_fts(rowid, prompt) VALUES (new.id, new.prompt);
+       END""",
+]
+
+# Bumped whenever the migration below changes, so up-to-date databases skip it
+SCHEMA_VERSION = 2
+
+# Bring an existing prompts table up to the current schema
+def migrate_db(conn):
+    cursor = conn.cursor()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    existing = {row[1] for row in cursor.execute('PRAGMA table_info(prompts)')}
+    for name, definition in MIGRATION_COLUMNS:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE prompts ADD COLUMN {name} {definition}')
+    for statement in MIGRATION_INDEXES:
+        cursor.execute(statement)
+
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prompts_fts'"
+    ).fetchone()
+    for statement in FTS_SCHEMA:
+        cursor.execute(statement)
+    if not fts_exists:
+        # Index the rows written before the full-text table existed
+        cursor.execute("INSERT INTO prompts_fts(prompts_fts) VALUES ('rebuild')")
+
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    conn.commit()
+
+# Pragmas applied to every connection. WAL lets readers run alongside a writer,
+# and busy_timeout makes concurrent writers wait instead of failing with
+# "database is locked".
+CONNECTION_PRAGMAS = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+]
+
 # Connect to the SQLite database
-def connect_db(db_name='prompts.db'):
-    return sqlite3.connect(db_name)
+def connect_db(db_name='prompts.db', check_same_thread=True):
+    conn = sqlite3.connect(db_name, timeout=5, check_same_thread=check_same_thread)
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """
+    Thread-safe pool of tuned SQLite connections.
+    A connection is used by one thread at a time but may move between threads,
+    as Streamlit runs each rerun on a fresh script thread. When the pool is
+    empty a new connection is opened rather than blocking, and connections
+    returned to a full pool are closed.
+    """
+
+    def __init__(self, db_name='prompts.db', size=8):
+        self.db_name = db_name
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect_db(self.db_name, check_same_thread=False)
+
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Process-wide pool per database file, shared by every Streamlit session
+def get_pool(db_name='prompts.db', size=8):
+    with _pools_lock:
+        if db_name not in _pools:
+            _pools[db_name] = ConnectionPool(db_name, size=size)
+        return _pools[db_name]
 
 # Insert a new prompt into the database
 def insert_prompt(conn, prompt, expected_style, image):
     cursor = conn.cursor()
     cursor.execute('''
-    INSERT INTO prompts (prompt, expected_style, image)
-    VALUES (?, ?, ?)
+    INSERT INTO prompts (prompt, expected_style, image, created_at)
+    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
     ''', (prompt, expected_style, image))
     conn.commit()
+    return cursor.lastrowid
+
+# Insert many prompts in a single transaction, rows are (prompt, expected_style, image)
+def insert_prompts(conn, rows):
+    with conn:
+        conn.executemany('''
+        INSERT INTO prompts (prompt, expected_style, image, created_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ''', rows)
 
 # Fetch all prompts from the database
 def fetch_prompts(conn):
@@ -44,6 +192,100 @@ def fetch_images(conn):
     cursor.execute('SELECT prompt, image FROM prompts')
     return cursor.fetchall()
 
+# Look up a cached generation, returns (id, image) or None
+def find_cached_image(conn, cache_key):
+    cursor = conn.cursor()
+    cursor.execute('SELECT id, image FROM prompts WHERE cache_key = ? ORDER BY id DESC LIMIT 1', (cache_key,))
+    return cursor.fetchone()
+
+# Insert a generated image together with its cache metadata
+def insert_cached_prompt(conn, prompt, expected_style, image, cache_key, file_size, last_used, image_hash=None):
+    cursor = conn.cursor()
+    cursor.execute('''
+    INSERT INTO prompts (prompt, expected_style, image, cache_key, file_size, last_used, image_hash, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ''', (prompt, expected_style, image, cache_key, file_size, last_used, image_hash))
+    conn.commit()
+    return cursor.lastrowid
+
+# Mark a cached image as recently used
+def touch_cached_image(conn, row_id, last_used):
+    conn.execute('UPDATE prompts SET last_used = ? WHERE id = ?', (last_used, row_id))
+    conn.commit()
+
+# Cached images ordered from least to most recently used, as (id, image, file_size)
+def fetch_cached_images_lru(conn):
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT id, image, file_size FROM prompts
+    WHERE cache_key IS NOT NULL
+    ORDER BY last_used
+    ''')
+    return cursor.fetchall()
+
+# Forget the cache entries of evicted images
+def clear_cache_entries(conn, row_ids):
+    conn.executemany('UPDATE prompts SET cache_key = NULL WHERE id = ?', [(row_id,) for row_id in row_ids])
+    conn.commit()
+
+# Fetch one gallery page, newest first, as (id, prompt, image, score) rows.
+# Keyset pagination: pass the smallest id of the previous page as before_id,
+# so every page is an index range scan no matter how deep it is.
+def fetch_images_page(conn, before_id=None, limit=20, style=None):
+    cursor = conn.cursor()
+    query = 'SELECT id, prompt, image, score FROM prompts'
+    conditions, params = [], []
+    if before_id is not None:
+        conditions.append('id < ?')
+        params.append(before_id)
+    if style is not None:
+        conditions.append('expected_style = ?')
+        params.append(style)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    cursor.execute(query + ' ORDER BY id DESC LIMIT ?', (*params, limit))
+    return cursor.fetchall()
+
+# Turn free text into an FTS5 query matching every word (as a prefix)
+def to_fts_query(text):
+    terms = [term.replace('"', '""') for term in text.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+# Full-text prompt search, newest first, paginated like fetch_images_page
+def search_prompts(conn, text, before_id=None, limit=20):
+    fts_query = to_fts_query(text)
+    if not fts_query:
+        return []
+    cursor = conn.cursor()
+    query = '''
+    SELECT p.id, p.prompt, p.image, p.score
+    FROM prompts_fts JOIN prompts p ON p.id = prompts_fts.rowid
+    WHERE prompts_fts MATCH ?
+    '''
+    params = [fts_query]
+    if before_id is not None:
+        query += ' AND p.id < ?'
+        params.append(before_id)
+    cursor.execute(query + ' ORDER BY p.id DESC LIMIT ?', (*params, limit))
+    return cursor.fetchall()
+
+# Fetch a chunk of rows to (re-)score, in id order starting after after_id
+def fetch_rows_for_scoring(conn, after_id=0, limit=256, only_missing=False):
+    cursor = conn.cursor()
+    query = 'SELECT id, prompt, image FROM prompts WHERE id > ?'
+    if only_missing:
+        query += ' AND score IS NULL'
+    cursor.execute(query + ' ORDER BY id LIMIT ?', (after_id, limit))
+    return cursor.fetchall()
+
+# Write evaluation results back, rows are (score, caption, evaluation, id)
+def update_scores(conn, rows):
+    cursor = conn.cursor()
+    cursor.executemany('''
+    UPDATE prompts SET score = ?, caption = ?, evaluation = ? WHERE id = ?
+    ''', rows)
+    conn.commit()
+
 # Main execution
 if __name__ == "__main__":
     # Initialize the database
@@ -70,8 +312,7 @@ if __name__ == "__main__":
     ]
 
     # Insert mock data into the database
-    for prompt_data in mock_data:
-        insert_prompt(connection, *prompt_data)
+    insert_prompts(connection, mock_data)
 
     # Fetch and print all prompts
     prompts = fetch_prompts(connection)
@@ -1,35 +1,167 @@
+import argparse
+import os
+import sys
+import torch
 from sentence_transformers import SentenceTransformer, util
 from transformers import BlipProcessor, BlipForConditionalGeneration
 from PIL import Image
+# resource_registry.py is shared by the apps in this repository and lives in ../shared
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "shared"))
+from resource_registry import registry
 
-# Load models for evaluation
-caption_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-caption_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-similarity_model = SentenceTransformer('all-MiniLM-L6-v2')
+CAPTION_MODEL = "Salesforce/blip-image-captioning-base"
+SIMILARITY_MODEL = "all-MiniLM-L6-v2"
+
+# Models for evaluation are loaded lazily into the process-wide registry, so
+# importing this module is cheap and all Streamlit sessions share one copy
+def load_caption_model(model_name):
+    return BlipProcessor.from_pretrained(model_name), BlipForConditionalGeneration.from_pretrained(model_name)
+
+def load_similarity_model(model_name):
+    return SentenceTransformer(model_name)
+
+def warmup_caption_model(caption):
+    caption_processor, caption_model = caption
+    inputs = caption_processor(images=Image.new("RGB", (64, 64)), return_tensors="pt")
+    caption_model.generate(**inputs, max_new_tokens=1)
+
+def warmup_similarity_model(similarity_model):
+    similarity_model.encode("warmup")
+
+def get_caption_model():
+    return registry.get("blip-captioner", load_caption_model, config={"model_name": CAPTION_MODEL},
+                        warmup=warmup_caption_model)
+
+def get_similarity_model():
+    return registry.get("sentence-transformer", load_similarity_model, config={"model_name": SIMILARITY_MODEL},
+                        warmup=warmup_similarity_model)
+
+def warmup_models():
+    """Starts loading both evaluation models in the background."""
+    registry.warmup_async("blip-captioner", load_caption_model, config={"model_name": CAPTION_MODEL},
+                          warmup=warmup_caption_model)
+    registry.warmup_async("sentence-transformer", load_similarity_model, config={"model_name": SIMILARITY_MODEL},
+                          warmup=warmup_similarity_model)
 
 def semantic_similarity(prompt, caption):
+    similarity_model = get_similarity_model()
     emb1 = similarity_model.encode(prompt, convert_to_tensor=True)
     emb2 = similarity_model.encode(caption, convert_to_tensor=True)
     return float(util.pytorch_cos_sim(emb1, emb2)[0][0])
 
-def evaluate_image(image_path, prompt):
-    # Load the image
-    image = Image.open(image_path)
-
-    # Prepare the image for captioning
-    inputs = caption_processor(images=image, return_tensors="pt")
-
-    # Generate the caption
-    out = caption_model.generate(**inputs)
-    generated_caption = caption_processor.decode(out[0], skip_special_tokens=True)
-
-    # Calculate similarity
-    score = semantic_similarity(prompt, generated_caption)
-    
-    # Provide feedback based on similarity score
+def score_to_feedback(score):
+    """Maps a prompt/caption similarity score to the feedback shown in the app."""
+    if score is None:
+        return "Image not found."
     if score > 0.8:
         return "Excellent match with the prompt 80%."
     elif score > 0.5:
         return "Good match, but could be better 50%."
     else:
         return "Poor match with the prompt."
+
+def caption_images(images, batch_size=16):
+    """Captions a list of PIL images with BLIP, batch_size images per generate call."""
+    caption_processor, caption_model = get_caption_model()
+    captions = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        inputs = caption_processor(images=batch, return_tensors="pt")
+        with torch.inference_mode():
+            out = caption_model.generate(**inputs)
+        captions.extend(caption_processor.batch_decode(out, skip_special_tokens=True))
+    return captions
+
+def open_rgb(image_path):
+    """Decodes an image to RGB; None when it is missing or unreadable."""
+    if not os.path.exists(image_path):
+        return None
+    try:
+        with Image.open(image_path) as image:
+            return image.convert("RGB")
+    except OSError:
+        return None
+
+def evaluate_images(pairs, batch_size=16):
+    """
+    Scores many (image_path, prompt) pairs at once.
+    Captions are generated in batches, prompts and captions are embedded in
+    batches, and all similarities come out of a single tensor op.
+    Returns one dict per pair with caption, numeric score and feedback text;
+    missing or unreadable images get score None.
+    """
+    pairs = list(pairs)
+    results = [
+        {"image_path": image_path, "prompt": prompt, "caption": None, "score": None}
+        for image_path, prompt in pairs
+    ]
+
+    # Images are decoded one batch at a time, so peak memory follows batch_size
+    # rather than the number of pairs
+    found, captions = [], []
+    for start in range(0, len(pairs), batch_size):
+        batch_found, images = [], []
+        for i in range(start, min(start + batch_size, len(pairs))):
+            image = open_rgb(pairs[i][0])
+            if image is not None:
+                batch_found.append(i)
+                images.append(image)
+        if images:
+            captions.extend(caption_images(images, batch_size=batch_size))
+            found.extend(batch_found)
+
+    if found:
+        prompts = [pairs[i][1] for i in found]
+
+        similarity_model = get_similarity_model()
+        prompt_emb = similarity_model.encode(prompts, batch_size=batch_size, convert_to_tensor=True,
+                                             normalize_embeddings=True)
+        caption_emb = similarity_model.encode(captions, batch_size=batch_size, convert_to_tensor=True,
+                                              normalize_embeddings=True)
+        # Normalized embeddings: the row-wise dot product is the paired cosine similarity
+        scores = (prompt_emb * caption_emb).sum(dim=1).tolist()
+
+        for i, caption, score in zip(found, captions, scores):
+            results[i]["caption"] = caption
+            results[i]["score"] = score
+
+    for result in results:
+        result["evaluation"] = score_to_feedback(result["score"])
+    return results
+
+def evaluate_image(image_path, prompt):
+    return evaluate_images([(image_path, prompt)], batch_size=1)[0]["evaluation"]
+
+def rescore_database(db_name="prompts.db", batch_size=16, chunk_size=256, only_missing=False):
+    """Re-scores the prompts table chunk by chunk and writes the results back."""
+    from database import init_db, connect_db, fetch_rows_for_scoring, update_scores
+
+    init_db(db_name)
+    conn = connect_db(db_name)
+    scored = 0
+    last_id = 0
+    try:
+        while True:
+            rows = fetch_rows_for_scoring(conn, after_id=last_id, limit=chunk_size, only_missing=only_missing)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            results = evaluate_images([(image, prompt) for _, prompt, image in rows], batch_size=batch_size)
+            update_scores(conn, [
+                (result["score"], result["caption"], result["evaluation"], row_id)
+                for (row_id, _, _), result in zip(rows, results)
+            ])
+            scored += len(rows)
+            print(f"Scored {scored} rows")
+    finally:
+        conn.close()
+    return scored
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score every image in the prompts table.")
+    parser.add_argument("--db", default="prompts.db")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--chunk-size", type=int, default=256, help="rows read and written per round trip")
+    parser.add_argument("--only-missing", action="store_true", help="skip rows that already have a score")
+    args = parser.parse_args()
+    rescore_database(args.db, batch_size=args.batch_size, chunk_size=args.chunk_size, only_missing=args.only_missing)
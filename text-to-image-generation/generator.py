@@ -1,38 +1,186 @@
 import requests
+from requests.adapters import HTTPAdapter
 import os
+import time
+import random
+import hashlib
+import json
 from dotenv import load_dotenv
 from PIL import Image
 from io import BytesIO
+from thumbnails import make_thumbnail, remove_thumbnails
+from database import (
+    find_cached_image,
+    insert_cached_prompt,
+    touch_cached_image,
+    fetch_cached_images_lru,
+    clear_cache_entries,
+)
 
 load_dotenv()
 STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
+STABILITY_ENDPOINT = os.getenv(
+    "STABILITY_ENDPOINT", "https://api.stability.ai/v2beta/stable-image/generate/ultra"
+)
+OUTPUT_FORMAT = "webp"
+IMAGES_DIR = "images"
+# Size bound for the images/ directory, least recently used images are evicted first
+MAX_CACHE_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", 500 * 1024 * 1024))
 
-def generate_image(prompt, style):
+def cache_key(prompt, style, endpoint=STABILITY_ENDPOINT, output_format=OUTPUT_FORMAT, seed=0):
+    """Content address of a generation request: sha256 over every input that changes the image."""
+    payload = json.dumps(
+        {"prompt": prompt, "style": style, "endpoint": endpoint, "output_format": output_format, "seed": seed},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def image_path_for_key(key):
+    # Hash-based names are collision free and safe for any prompt text
+    return os.path.join(IMAGES_DIR, f"{key[:32]}.{OUTPUT_FORMAT}")
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = float(os.getenv("STABILITY_TIMEOUT", 120))
+
+def make_session(pool_size=10):
+    """HTTP session whose connection pool is reused across generation requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({
+        "Authorization": f"Bearer {STABILITY_API_KEY}",
+        "Accept": "image/*"
+    })
+    return session
+
+_session = None
+
+def get_session():
+    global _session
+    if _session is None:
+        _session = make_session()
+    return _session
+
+def retry_delay(attempt, response=None, backoff=1.0, max_delay=30.0):
+    """Exponential backoff with jitter, honouring a Retry-After header in seconds."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), max_delay)
+    return min(backoff * (2 ** attempt), max_delay) * (0.5 + random.random() / 2)
+
+def request_image(prompt, style, seed=0, session=None, timeout=REQUEST_TIMEOUT, max_retries=3, backoff=1.0):
+    """
+    Posts one generation request and returns the raw image bytes.
+    429 and 5xx responses and connection errors are retried with backoff.
+    """
+    session = session or get_session()
     styled_prompt = f"{prompt}, {style} style"
-    response = requests.post(
-        "https://api.stability.ai/v2beta/stable-image/generate/ultra",
-        headers={
-            "Authorization": f"Bearer {STABILITY_API_KEY}",
-            "Accept": "image/*"
-        },
-        files={"none": ''},
-        data={
-            "prompt": styled_prompt,
-            "output_format": "webp"
-        }
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.post(
+                STABILITY_ENDPOINT,
+                files={"none": ''},
+                data={
+                    "prompt": styled_prompt,
+                    "output_format": OUTPUT_FORMAT,
+                    "seed": seed
+                },
+                timeout=timeout
+            )
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_delay(attempt, backoff=backoff))
+            continue
+
+        if response.status_code == 200:
+            return response.content
+        if response.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+            raise Exception(f"Image generation failed: {response.text}")
+        time.sleep(retry_delay(attempt, response, backoff=backoff))
+
+def save_image(content, image_filename):
+    # Keep the compact webp the API returned as-is (converting it to PNG made
+    # files several times larger) after checking it decodes, then pre-generate
+    # the gallery thumbnail
+    with Image.open(BytesIO(content)) as image:
+        image.verify()
+    os.makedirs(os.path.dirname(image_filename), exist_ok=True)
+    with open(image_filename, "wb") as f:
+        f.write(content)
+    make_thumbnail(image_filename)
+    return image_filename
+
+def generate_image(prompt, style, seed=0, image_filename=None, session=None):
+    content = request_image(prompt, style, seed=seed, session=session)
+    if image_filename is None:
+        image_filename = image_path_for_key(cache_key(prompt, style, seed=seed))
+    return save_image(content, image_filename)
+
+def lookup_cached_image(conn, prompt, style, seed=0):
+    """Returns (image_path, row_id) for an already rendered request, or None."""
+    cached = find_cached_image(conn, cache_key(prompt, style, seed=seed))
+    if cached:
+        row_id, image_path = cached
+        if os.path.exists(image_path):
+            touch_cached_image(conn, row_id, time.time())
+            return image_path, row_id
+        # The file was removed behind our back: drop the entry and regenerate
+        clear_cache_entries(conn, [row_id])
+    return None
+
+def record_generated_image(conn, prompt, style, image_path, seed=0):
+    """Inserts a freshly generated image into the cache and returns its row id."""
+    with open(image_path, "rb") as f:
+        image_hash = hashlib.sha256(f.read()).hexdigest()
+    row_id = insert_cached_prompt(
+        conn, prompt, style, image_path, cache_key(prompt, style, seed=seed),
+        os.path.getsize(image_path), time.time(), image_hash=image_hash
     )
-    
-    if response.status_code == 200:
-        # Convert the response content to an image
-        image = Image.open(BytesIO(response.content))
-
-        # Save the image as PNG
-        image_filename = f"images/{prompt.replace(' ', '_')}_{style}.png"
-        image.save(image_filename, format='PNG')
-
-        return image_filename
-    else:
-        raise Exception(f"Image generation failed: {response.text}")
+    evict_images(conn, MAX_CACHE_BYTES, keep=image_path)
+    return row_id
+
+def generate_image_cached(conn, prompt, style, seed=0):
+    """
+    Returns (image_path, row_id, cache_hit) for a prompt + style.
+    A request already rendered is served from the prompts table and images/
+    with no network I/O; otherwise the image is generated, recorded and the
+    images/ directory is trimmed back under MAX_CACHE_BYTES.
+    """
+    cached = lookup_cached_image(conn, prompt, style, seed=seed)
+    if cached:
+        return cached[0], cached[1], True
+
+    image_path = generate_image(prompt, style, seed=seed)
+    row_id = record_generated_image(conn, prompt, style, image_path, seed=seed)
+    return image_path, row_id, False
+
+def evict_images(conn, max_bytes=MAX_CACHE_BYTES, keep=None):
+    """
+    Deletes least recently used cached images until images/ fits in max_bytes.
+    Only the files go: the rows (prompt history, score, caption) stay, with
+    their cache_key cleared, and the gallery shows a placeholder for them.
+    Returns the evicted row ids.
+    """
+    entries = fetch_cached_images_lru(conn)
+    total = sum(file_size or 0 for _, _, file_size in entries)
+    evicted = []
+    for row_id, image_path, file_size in entries:
+        if total <= max_bytes:
+            break
+        if image_path == keep:
+            continue
+        if os.path.exists(image_path):
+            os.remove(image_path)
+        remove_thumbnails(image_path)
+        total -= file_size or 0
+        evicted.append(row_id)
+    if evicted:
+        clear_cache_entries(conn, evicted)
+    return evicted
 
 # Example usage:
 # image_path = generate_image("A serene landscape", "impressionist")
@@ -0,0 +1,80 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from generator import (
+    make_session,
+    request_image,
+    save_image,
+    image_path_for_key,
+    cache_key,
+    lookup_cached_image,
+    record_generated_image,
+    REQUEST_TIMEOUT,
+)
+
+class GenerationQueue:
+    """
+    Runs batches of (prompt, style) generation jobs on a thread pool.
+
+    All workers share one pooled HTTP session, at most max_in_flight requests
+    hit the API at once, and 429/5xx responses are retried with backoff by
+    request_image. Results are yielded as each image lands, so the caller can
+    render them without waiting for the whole batch.
+    """
+
+    def __init__(self, max_workers=4, max_in_flight=None, max_retries=3, backoff=1.0, timeout=REQUEST_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = make_session(pool_size=max_workers)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight or max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+
+    def _run_job(self, prompt, style, seed):
+        with self._in_flight:
+            content = request_image(
+                prompt, style, seed=seed, session=self.session,
+                timeout=self.timeout, max_retries=self.max_retries, backoff=self.backoff
+            )
+        return save_image(content, image_path_for_key(cache_key(prompt, style, seed=seed)))
+
+    def run(self, jobs, conn=None):
+        """
+        Generates every (prompt, style) or (prompt, style, seed) job and yields
+        dicts with prompt, style, image_path, row_id, cache_hit and error as
+        they complete. With a connection, cached jobs are answered without a
+        request and new images are recorded; database access stays on the
+        calling thread because sqlite connections are not shared across threads.
+        """
+        futures = {}
+        seen = set()
+        for job in jobs:
+            prompt, style = job[0], job[1]
+            seed = job[2] if len(job) > 2 else 0
+            if (prompt, style, seed) in seen:
+                continue
+            seen.add((prompt, style, seed))
+
+            if conn is not None:
+                cached = lookup_cached_image(conn, prompt, style, seed=seed)
+                if cached:
+                    yield {"prompt": prompt, "style": style, "image_path": cached[0], "row_id": cached[1],
+                           "cache_hit": True, "error": None}
+                    continue
+            futures[self._executor.submit(self._run_job, prompt, style, seed)] = (prompt, style, seed)
+
+        for future in as_completed(futures):
+            prompt, style, seed = futures[future]
+            result = {"prompt": prompt, "style": style, "image_path": None, "row_id": None,
+                      "cache_hit": False, "error": None}
+            try:
+                result["image_path"] = future.result()
+                if conn is not None:
+                    result["row_id"] = record_generated_image(conn, prompt, style, result["image_path"], seed=seed)
+            except Exception as e:
+                result["error"] = str(e)
+            yield result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
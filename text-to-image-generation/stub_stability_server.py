@@ -0,0 +1,70 @@
+"""
+Local stand-in for the Stability generate endpoint, for exercising the
+generation queue without an API key or network access.
+
+    python stub_stability_server.py --port 8765 --fail-rate 0.3 --latency 0.5
+    STABILITY_ENDPOINT=http://127.0.0.1:8765/v2beta/stable-image/generate/ultra streamlit run app.py
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from PIL import Image
+
+class StubHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    latency = 0.0
+    request_count = 0
+    _lock = threading.Lock()
+
+    def do_POST(self):
+        # Drain the multipart body so the connection can be reused
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with StubHandler._lock:
+            StubHandler.request_count += 1
+        time.sleep(self.latency)
+
+        if random.random() < self.fail_rate:
+            status = random.choice([429, 503])
+            body = b'{"errors": ["stub failure"]}'
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            if status == 429:
+                self.send_header("Retry-After", "1")
+        else:
+            buffer = BytesIO()
+            color = tuple(random.randrange(256) for _ in range(3))
+            Image.new("RGB", (256, 256), color).save(buffer, format="WEBP")
+            body = buffer.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/webp")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port=0, fail_rate=0.0, latency=0.0):
+    """Starts the stub on a background thread and returns (server, endpoint_url)."""
+    StubHandler.fail_rate = fail_rate
+    StubHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/v2beta/stable-image/generate/ultra"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Stability image API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 429/503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    server, endpoint = start_stub_server(args.port, args.fail_rate, args.latency)
+    print(f"Stub Stability API listening on {endpoint}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,47 @@
+import hashlib
+import os
+from PIL import Image
+
+THUMBNAILS_DIR = os.path.join("images", "thumbs")
+THUMBNAIL_SIZE = 256
+THUMBNAIL_QUALITY = 80
+
+def thumbnail_path(image_path, size=THUMBNAIL_SIZE):
+    # Keyed on the full path: images in different folders may share a file name
+    digest = hashlib.sha256(os.path.abspath(image_path).encode("utf-8")).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(image_path))[0][:32]
+    return os.path.join(THUMBNAILS_DIR, f"{stem}_{digest}_{size}.webp")
+
+def make_thumbnail(image_path, size=THUMBNAIL_SIZE, quality=THUMBNAIL_QUALITY):
+    """Writes a size x size (aspect preserved) webp thumbnail next to the gallery images."""
+    path = thumbnail_path(image_path, size)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(image_path) as image:
+        # draft() lets JPEG decoders downscale while decoding; a no-op for other formats
+        image.draft("RGB", (size, size))
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        image.save(path, format="WEBP", quality=quality, method=4)
+    return path
+
+def get_thumbnail(image_path, size=THUMBNAIL_SIZE):
+    """
+    Returns the thumbnail for an image, creating it on first request so images
+    stored before thumbnails existed are converted lazily, one page at a time.
+    Returns None when the original image is missing.
+    """
+    path = thumbnail_path(image_path, size)
+    if os.path.exists(path):
+        return path
+    if not os.path.exists(image_path):
+        return None
+    try:
+        return make_thumbnail(image_path, size)
+    except OSError:
+        return None
+
+def remove_thumbnails(image_path, sizes=(THUMBNAIL_SIZE,)):
+    for size in sizes:
+        path = thumbnail_path(image_path, size)
+        if os.path.exists(path):
+            os.remove(path)